@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+""" Time a cache hit of a 5000 row listings/latest response, from the
+session lookup to the decoded JSON, and the size of the database with the
+pickled responses of the "sqlite" backend and the compressed bodies of the
+"compressed" backend.
+
+    python benchmarks/cache.py
+"""
+
+from json import loads
+from tempfile import TemporaryDirectory
+from timeit import repeat
+import os
+import requests
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coinmarketcap.environment import CachedSession  # noqa: E402
+from decode import payload  # noqa: E402
+
+URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
+
+
+def fill(session, body, entries):
+    """ Store "entries" responses, the first one is the timed hit. """
+    for i in range(entries):
+        res = requests.Response()
+        res.status_code = 200
+        res._content = body
+        res.url = "%s?start=%d" % (URL, i + 1)
+        res.headers["Content-Type"] = "application/json"
+        res.headers["Date"] = "Sat, 17 Oct 2026 10:00:00 GMT"
+        res.request = requests.Request("GET", res.url).prepare()
+        session.cache.save_response(session.cache.create_key(res.request),
+                                    res)
+
+
+def size(temp):
+    return sum(os.path.getsize(os.path.join(temp, name))
+               for name in os.listdir(temp))
+
+
+def main(number=20, entries=20):
+    body = payload()
+    print("payload: %.1f MB, %d entries" % (len(body) / 1e6, entries))
+    base = None
+    for backend in ("sqlite", "compressed"):
+        with TemporaryDirectory() as temp:
+            session = CachedSession(os.path.join(temp, "cache"), None, backend)
+            fill(session, body, entries)
+            url = URL + "?start=1"
+            assert session.get(url).from_cache
+
+            best = min(repeat(lambda: loads(session.get(url).content),
+                              number=number, repeat=5)) / number
+            base = base or best
+            print("%-12s %8.2f ms  %5.2fx  %8.1f MB" % (
+                backend, best * 1e3, base / best, size(temp) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
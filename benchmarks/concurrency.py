@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+""" Throughput of the cache backends under 32 threads, each thread looks up
+cached 100 row listings/latest responses in the backend and saves one
+response for every "writes" lookups. The backends are called directly, the
+requests overhead of the session would hide their locking. Errors, E.g
+"database is locked", are counted instead of raised.
+
+    python benchmarks/concurrency.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import os
+import random
+import requests
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coinmarketcap.environment import CachedSession  # noqa: E402
+from decode import payload  # noqa: E402
+
+URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
+
+
+def response(body, i):
+    res = requests.Response()
+    res.status_code = 200
+    res._content = body
+    res.url = "%s?start=%d" % (URL, i)
+    res.headers["Content-Type"] = "application/json"
+    res.request = requests.Request("GET", res.url).prepare()
+    return res
+
+
+def key(session, i):
+    request = requests.Request("GET", "%s?start=%d" % (URL, i)).prepare()
+    return session.cache.create_key(request)
+
+
+def save(session, body, i):
+    session.cache.save_response(key(session, i), response(body, i))
+
+
+def work(session, body, keys, operations, writes):
+    rng = random.Random()
+    errors = 0
+    for n in range(operations):
+        try:
+            if n % writes == 0:
+                save(session, body, len(keys) + rng.randrange(len(keys)))
+            else:
+                res, _ = session.cache.get_response_and_time(rng.choice(keys))
+                assert res.content
+        except Exception:
+            errors += 1
+    return errors
+
+
+def main(threads=32, entries=200, operations=500, writes=4):
+    body = payload(rows=100)
+    print("%d threads, %d operations each, 1 write every %d" % (
+        threads, operations, writes))
+    base = None
+    for backend in ("sqlite", "compressed", "concurrent"):
+        with TemporaryDirectory() as temp:
+            session = CachedSession(os.path.join(temp, "cache"), None, backend)
+            for i in range(1, entries + 1):
+                save(session, body, i)
+            if hasattr(session.cache, "flush"):
+                session.cache.flush()
+            keys = [key(session, i) for i in range(1, entries + 1)]
+
+            start = perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                errors = sum(pool.map(
+                    lambda _: work(session, body, keys, operations, writes),
+                    range(threads)))
+            if hasattr(session.cache, "flush"):
+                session.cache.flush()
+            rate = threads * operations / (perf_counter() - start)
+            base = base or rate
+            print("%-12s %8.0f ops/s  %5.2fx  %d errors" % (
+                backend, rate, rate / base, errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+""" Time the decoding of a 5000 row listings/latest payload on the response
+hot path: json.loads(response.text), the stdlib decoder on the body bytes
+and orjson on the body bytes, if it is installed.
+
+    python benchmarks/decode.py
+"""
+
+from json import dumps, loads
+from timeit import repeat
+import requests
+
+
+def payload(rows=5000, converts=("USD", "EUR", "BTC")):
+    quote = {
+        "price": 9283.92,
+        "volume_24h": 7155680000.0,
+        "percent_change_1h": -0.152774,
+        "percent_change_24h": 0.518894,
+        "percent_change_7d": 0.986573,
+        "market_cap": 158055024432.0,
+        "last_updated": "2019-08-30T18:51:28.000Z",
+    }
+    data = [
+        {
+            "id": i,
+            "name": "Coin %d" % i,
+            "symbol": "C%d" % i,
+            "slug": "coin-%d" % i,
+            "cmc_rank": i,
+            "num_market_pairs": 500,
+            "circulating_supply": 16950100.0,
+            "total_supply": 16950100.0,
+            "max_supply": 21000000.0,
+            "last_updated": "2019-08-30T18:51:28.000Z",
+            "date_added": "2013-04-28T00:00:00.000Z",
+            "tags": ["mineable"],
+            "platform": None,
+            "quote": {convert: dict(quote) for convert in converts},
+        }
+        for i in range(1, rows + 1)
+    ]
+    body = {"status": {"credit_count": 25, "elapsed": 10}, "data": data}
+    return dumps(body).encode()
+
+
+def response(body):
+    res = requests.Response()
+    res.status_code = 200
+    res._content = body
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def main(number=20):
+    body = payload()
+    cases = {
+        "json.loads(response.text)": lambda: loads(response(body).text),
+        "json.loads(response.content)": lambda: loads(response(body).content),
+    }
+    try:
+        import orjson
+
+        cases["orjson.loads(response.content)"] = lambda: orjson.loads(
+            response(body).content)
+    except ImportError:
+        print("orjson is not installed")
+
+    print("payload: %.1f MB" % (len(body) / 1e6))
+    base = None
+    for name, case in cases.items():
+        best = min(repeat(case, number=number, repeat=5)) / number
+        base = base or best
+        print("%-32s %8.2f ms  %5.2fx" % (name, best * 1e3, base / best))
+
+
+if __name__ == "__main__":
+    main()
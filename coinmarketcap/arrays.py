@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+OHLCV = ("open", "high", "low", "close", "volume", "market_cap")
+QUOTES = ("price", "volume_24h", "market_cap")
+GLOBAL_METRICS = ("total_market_cap", "total_volume_24h")
+
+
+def ohlcv(data, convert="USD", columns=False):
+    """ Returns the OHLCV bars as a structured array with the fields "time"
+    (int64 Unix time of "time_open") and float64 "open", "high", "low",
+    "close", "volume" and "market_cap". Missing values are NaN.
+
+    Parameters
+    ----------
+    data : `json obj` or `list` of `json obj`
+        The data of cryptocurrency.ohlcv.historical_id or a list of bars.
+    convert : `str`, optional
+        The currency of the quotes.
+    columns : `bool`, optional
+        Return a `dict` of contiguous arrays by field instead.
+
+    Returns
+    -------
+    `numpy.ndarray` or `dict` of `numpy.ndarray`
+    """
+    return _array(data, "time_open", OHLCV, convert, columns)
+
+
+def quotes(data, convert="USD", columns=False):
+    """ Returns the quotes as a structured array with the fields "time"
+    (int64 Unix time of "timestamp") and float64 "price", "volume_24h" and
+    "market_cap", or "total_market_cap" and "total_volume_24h" for global
+    metrics. Missing values are NaN.
+
+    Parameters
+    ----------
+    data : `json obj` or `list` of `json obj`
+        The data of a quotes/historical endpoint or a list of quotes.
+    convert : `str`, optional
+        The currency of the quotes.
+    columns : `bool`, optional
+        Return a `dict` of contiguous arrays by field instead.
+
+    Returns
+    -------
+    `numpy.ndarray` or `dict` of `numpy.ndarray`
+    """
+    bars = data["quotes"] if isinstance(data, dict) else data
+    fields = QUOTES
+    if bars and "total_market_cap" in bars[0]["quote"][convert]:
+        fields = GLOBAL_METRICS
+    return _array(bars, "timestamp", fields, convert, columns)
+
+
+def _array(data, time, fields, convert, columns):
+    import numpy as np
+
+    bars = data["quotes"] if isinstance(data, dict) else data
+    nan = float("nan")
+    dtype = np.dtype([("time", "i8")] + [(name, "f8") for name in fields])
+    res = np.empty(len(bars), dtype)
+    res["time"] = np.array(
+        [bar[time].rstrip("Z") for bar in bars], "datetime64[ms]"
+    ).astype("datetime64[s]").astype("i8")
+    values = np.fromiter(
+        (tuple(nan if v is None else v for v in map(quote.get, fields))
+         for quote in (bar["quote"][convert] for bar in bars)),
+        np.dtype([(name, "f8") for name in fields]), len(bars))
+    for name in fields:
+        res[name] = values[name]
+
+    if columns:
+        return {name: np.ascontiguousarray(res[name])
+                for name in res.dtype.names}
+    return res
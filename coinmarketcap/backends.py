@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from http.client import responses
+from requests_cache.backends.base import BaseCache, _RawStore
+from threading import Event, Lock, RLock, Thread, local
+import atexit
+import os
+import requests
+import sqlite3
+import weakref
+import zlib
+
+# local
+from .cache import Connections
+
+# JSON shared by most CoinMarketCap responses, used as the preset dictionary
+# of the compressors so even small bodies compress well. The most frequent
+# strings are at the end, closest to the data. Changing it requires a new
+# VERSION, since stored bodies can only be decompressed with their own.
+DICTIONARY = (
+    b'{"status":{"timestamp":"2020-01-01T00:00:00.000Z","error_code":0,'
+    b'"error_message":null,"elapsed":10,"credit_count":1,"notice":null},'
+    b'"data":{"market_pairs":[{"exchange":{"id":1,"name":"","slug":""},'
+    b'"market_id":1,"market_pair":"BTC/USD","category":"spot",'
+    b'"fee_type":"percentage","market_pair_base":{"currency_id":1,'
+    b'"currency_symbol":"BTC","exchange_symbol":"BTC","currency_type":'
+    b'"cryptocurrency"},"market_pair_quote":{"currency_id":2781,'
+    b'"currency_symbol":"USD","exchange_symbol":"USD","currency_type":'
+    b'"fiat"},"quote":{"exchange_reported":{"price":1,"volume_24h_base":1,'
+    b'"volume_24h_quote":1,"last_updated":""},"USD":{"price":1,'
+    b'"volume_24h":1,"last_updated":""}}}],"quotes":[{"time_open":"",'
+    b'"time_close":"","time_high":"","time_low":"","quote":{"USD":{'
+    b'"open":1,"high":1,"low":1,"close":1,"volume":1,"market_cap":1,'
+    b'"timestamp":""}}}]},"data":[{"id":1,"name":"Bitcoin","symbol":"BTC",'
+    b'"slug":"bitcoin","cmc_rank":1,"num_market_pairs":1,'
+    b'"circulating_supply":1,"total_supply":1,"max_supply":null,'
+    b'"last_updated":"2020-01-01T00:00:00.000Z","date_added":'
+    b'"2013-04-28T00:00:00.000Z","tags":["mineable"],"platform":null,'
+    b'"quote":{"USD":{"price":1,"volume_24h":1,"percent_change_1h":0.1,'
+    b'"percent_change_24h":0.1,"percent_change_7d":0.1,"market_cap":1,'
+    b'"last_updated":"2020-01-01T00:00:00.000Z"}}},{"id":'
+)
+VERSION = 1
+SCHEMA = (
+    "create table if not exists `responses` "
+    "(key PRIMARY KEY, created, status, url, date, codec, body)",
+    "create table if not exists `redirects` (key PRIMARY KEY, target)",
+)
+
+
+class Zlib:
+    """ zlib codec with the preset dictionary. """
+
+    name = "zlib:%d" % VERSION
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(
+            self.level, zlib.DEFLATED, zlib.MAX_WBITS, 9,
+            zlib.Z_DEFAULT_STRATEGY, DICTIONARY)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = zlib.decompressobj(zdict=DICTIONARY)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+class Zstd:
+    """ zstd codec with the preset dictionary, requires zstandard. The
+    compressors are not thread safe, each thread has its own.
+    """
+
+    name = "zstd:%d" % VERSION
+
+    def __init__(self, level=3):
+        import zstandard
+
+        self.level = level
+        self.dictionary = zstandard.ZstdCompressionDict(
+            DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        self.local = local()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = getattr(self.local, "compressor", None)
+        if compressor is None:
+            import zstandard
+
+            compressor = self.local.compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self.dictionary)
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = getattr(self.local, "decompressor", None)
+        if decompressor is None:
+            import zstandard
+
+            decompressor = self.local.decompressor = (
+                zstandard.ZstdDecompressor(dict_data=self.dictionary))
+        return decompressor.decompress(data)
+
+
+def codecs() -> dict:
+    """ Returns the available codecs by name, zstd first if zstandard is
+    installed.
+    """
+    available = {}
+    try:
+        available[Zstd.name] = Zstd()
+    except ImportError:
+        pass
+    available[Zlib.name] = Zlib()
+    return available
+
+
+class CompressedCache(BaseCache):
+    """ requests_cache backend which stores only the decoded body of each
+    response, compressed with zstd or zlib, and its status, url and Date
+    header in a sqlite database, instead of the pickled Response.
+
+    Entries compressed with a codec which is not available anymore, E.g
+    after zstandard was uninstalled, are treated as missing.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the sqlite database.
+    """
+
+    def __init__(self, path, **options):
+        BaseCache.__init__(self, **options)
+        self.path = path
+        self.codecs = codecs()
+        self.codec = next(iter(self.codecs.values()))
+        self.lock = RLock()
+        self._con = None
+        with self.connection() as con:
+            for statement in SCHEMA:
+                con.execute(statement)
+
+    def connection(self):
+        """ Returns the connection, used as a context manager it commits the
+        transaction.
+        """
+        if self._con is None:
+            self._con = sqlite3.connect(self.path, check_same_thread=False)
+        return self._con
+
+    def close(self):
+        """ Close the connection. """
+        with self.lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def save_response(self, key, response):
+        row = self.reduce(key, response)
+        with self.lock, self.connection() as con:
+            con.execute(
+                "insert or replace into `responses` values (?,?,?,?,?,?,?)",
+                row)
+
+    def reduce(self, key, response) -> tuple:
+        """ Returns the row stored for a response. """
+        return (
+            key,
+            datetime.utcnow().isoformat(),
+            response.status_code,
+            response.url or response.request.url,
+            response.headers.get("Date"),
+            self.codec.name,
+            self.codec.compress(response.content),
+        )
+
+    def restore(self, row):
+        """ Returns the response and creation time of a row, or `None` if
+        its codec is not available.
+        """
+        created, status, url, date, codec, body = row
+        codec = self.codecs.get(codec)
+        if codec is None:
+            return None
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.reason = responses.get(status)
+        response.encoding = "utf-8"
+        response._content = codec.decompress(body)
+        response._content_consumed = True
+        response.headers["Content-Type"] = "application/json"
+        if date is not None:
+            response.headers["Date"] = date
+        response.request = requests.Request("GET", url).prepare()
+        response.raw = _RawStore()
+        response.raw._cached_content_ = response._content
+        return response, datetime.fromisoformat(created)
+
+    def add_key_mapping(self, new_key, key_to_response):
+        with self.lock, self.connection() as con:
+            con.execute("insert or replace into `redirects` values (?,?)",
+                        (new_key, key_to_response))
+
+    def get_response_and_time(self, key, default=(None, None)):
+        row = self._row(key)
+        if row is None:
+            return default
+        return self.restore(row) or default
+
+    def _row(self, key, columns="created, status, url, date, codec, body"):
+        with self.lock:
+            return self.connection().execute(
+                "select %s from `responses` where key=? or key=(select "
+                "target from `redirects` where key=?)" % columns,
+                (key, key)).fetchone()
+
+    def delete(self, key):
+        with self.lock, self.connection() as con:
+            con.execute(
+                "delete from `responses` where key=? or key=(select target "
+                "from `redirects` where key=?)", (key, key))
+            con.execute("delete from `redirects` where key=? or target=?",
+                        (key, key))
+
+    def clear(self):
+        with self.lock, self.connection() as con:
+            con.execute("delete from `responses`")
+            con.execute("delete from `redirects`")
+
+    def remove_old_entries(self, created_before):
+        with self.lock, self.connection() as con:
+            con.execute("delete from `responses` where created < ?",
+                        (created_before.isoformat(),))
+            con.execute(
+                "delete from `redirects` where target not in "
+                "(select key from `responses`)")
+
+    def has_key(self, key):
+        return self._row(key, "key") is not None
+
+    def __str__(self):
+        return "CompressedCache(%r)" % self.path
+
+
+class ConcurrentCache(CompressedCache):
+    """ CompressedCache for many threads and processes. The entries are
+    spread over "shards" sqlite databases in WAL mode by a hash of their key,
+    so readers never wait for a writer and writers to different shards don't
+    wait for each other. Each thread has its own connections.
+
+    Responses are saved by a single writer thread, in one transaction per
+    shard for every "batch" responses or after "delay" seconds. Until then
+    they are read from memory. Pending responses are written when the
+    interpreter exits, or with "flush". "close" stops the writer thread and
+    closes the connections.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the directory of the shards.
+    shards : `int`, optional
+        The number of databases.
+    batch : `int`, optional
+        Write once "batch" responses are pending.
+    delay : `float`, optional
+        Seconds a response is pending at most.
+    """
+
+    def __init__(self, path, shards=16, batch=64, delay=0.05, **options):
+        BaseCache.__init__(self, **options)
+        self.path = path
+        self.shards = shards
+        self.batch = batch
+        self.delay = delay
+        self.codecs = codecs()
+        self.codec = next(iter(self.codecs.values()))
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.pending = {}
+        self.redirects = {}
+        self._wake = Event()
+        self._full = Event()
+        self._closed = Event()
+        self._writer = None
+
+        os.makedirs(path, exist_ok=True)
+        self._connections = [
+            Connections(os.path.join(path, "%02x.sqlite" % shard),
+                        isolation_level=None)
+            for shard in range(shards)]
+        for shard in range(shards):
+            con = self.connection(shard)
+            con.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                con.execute(statement)
+        OPEN.add(self)
+        # the writer thread exits once the cache is closed or collected
+        weakref.finalize(self, _stop, self._wake, self._closed)
+
+    def shard(self, key) -> int:
+        return zlib.crc32(key.encode()) % self.shards
+
+    def connection(self, shard):
+        """ Returns the connection of the calling thread to a shard. """
+        return self._connections[shard]()
+
+    def save_response(self, key, response):
+        row = self.reduce(key, response)
+        with self.lock:
+            self.pending[key] = row
+            full = len(self.pending) + len(self.redirects) >= self.batch
+        self._start()
+        self._wake.set()
+        if full:
+            self._full.set()
+
+    def add_key_mapping(self, new_key, key_to_response):
+        with self.lock:
+            self.redirects[new_key] = key_to_response
+        self._start()
+        self._wake.set()
+
+    def get_response_and_time(self, key, default=(None, None)):
+        row = self._row(key)
+        if row is None:
+            return default
+        return self.restore(row) or default
+
+    def _row(self, key, columns="created, status, url, date, codec, body"):
+        row = self._pending(key) or self._select(key, columns)
+        if row is None:
+            target = self._target(key)
+            if target is not None:
+                row = self._pending(target) or self._select(target, columns)
+        return row
+
+    def _pending(self, key):
+        with self.lock:
+            row = self.pending.get(key)
+        return None if row is None else row[1:]
+
+    def _select(self, key, columns):
+        return self.connection(self.shard(key)).execute(
+            "select %s from `responses` where key=?" % columns,
+            (key,)).fetchone()
+
+    def _target(self, key):
+        with self.lock:
+            target = self.redirects.get(key)
+        if target is None:
+            row = self.connection(self.shard(key)).execute(
+                "select target from `redirects` where key=?",
+                (key,)).fetchone()
+            target = None if row is None else row[0]
+        return target
+
+    def flush(self):
+        """ Write the pending responses. """
+        with self.write_lock:
+            with self.lock:
+                rows = dict(self.pending)
+                redirects = dict(self.redirects)
+            try:
+                self._write(rows, redirects)
+            finally:
+                # responses saved again while writing stay pending
+                with self.lock:
+                    for key, row in rows.items():
+                        if self.pending.get(key) is row:
+                            del self.pending[key]
+                    for key, target in redirects.items():
+                        if self.redirects.get(key) == target:
+                            del self.redirects[key]
+
+    def _write(self, rows, redirects):
+        shards = {}
+        for key, row in rows.items():
+            shards.setdefault(self.shard(key), ([], []))[0].append(row)
+        for key, target in redirects.items():
+            shards.setdefault(self.shard(key), ([], []))[1].append(
+                (key, target))
+        for shard, (rows, redirects) in shards.items():
+            con = self.connection(shard)
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                con.executemany("insert or replace into `responses` "
+                                "values (?,?,?,?,?,?,?)", rows)
+                con.executemany("insert or replace into `redirects` "
+                                "values (?,?)", redirects)
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    def close(self):
+        """ Write the pending responses, stop the writer thread and close
+        the connections. The cache can't be used anymore.
+        """
+        self.flush()
+        self._closed.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+        for connections in self._connections:
+            connections.close()
+        OPEN.discard(self)
+
+    def _start(self):
+        if self._writer is None:
+            with self.lock:
+                if self._writer is None:
+                    self._writer = Thread(target=_write, daemon=True, args=(
+                        weakref.ref(self), self._wake, self._full,
+                        self._closed, self.delay))
+                    self._writer.start()
+
+    def delete(self, key):
+        with self.write_lock:
+            target = self._target(key)
+            with self.lock:
+                self.pending.pop(key, None)
+                self.redirects.pop(key, None)
+                if target is not None:
+                    self.pending.pop(target, None)
+            self.connection(self.shard(key)).execute(
+                "delete from `redirects` where key=?", (key,))
+            for key in (key, target):
+                if key is not None:
+                    self.connection(self.shard(key)).execute(
+                        "delete from `responses` where key=?", (key,))
+
+    def clear(self):
+        with self.write_lock:
+            with self.lock:
+                self.pending.clear()
+                self.redirects.clear()
+            for shard in range(self.shards):
+                con = self.connection(shard)
+                con.execute("delete from `responses`")
+                con.execute("delete from `redirects`")
+
+    def remove_old_entries(self, created_before):
+        self.flush()
+        for shard in range(self.shards):
+            con = self.connection(shard)
+            con.execute("delete from `responses` where created < ?",
+                        (created_before.isoformat(),))
+
+    def __str__(self):
+        return "ConcurrentCache(%r)" % self.path
+
+
+# the open ConcurrentCaches, which are flushed when the interpreter exits
+OPEN = weakref.WeakSet()
+
+
+def _write(ref, wake, full, closed, delay):
+    """ Writer thread of a ConcurrentCache, it only holds the cache while it
+    writes.
+    """
+    while True:
+        wake.wait()
+        if closed.is_set():
+            return
+        full.wait(delay)
+        wake.clear()
+        full.clear()
+        cache = ref()
+        if cache is None:
+            return
+        try:
+            cache.flush()
+        except sqlite3.Error:
+            # a cache may lose entries, the responses are refetched
+            pass
+        del cache
+
+
+def _stop(wake, closed):
+    closed.set()
+    wake.set()
+
+
+@atexit.register
+def _flush():
+    for cache in list(OPEN):
+        cache.flush()
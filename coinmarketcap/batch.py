@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event, Lock
+from requests.exceptions import HTTPError
+import asyncio
+
+# local
+from .cache import Subsets
+from .endpoints import Cryptocurrency, Exchange, GlobalMetrics, Tools
+from .endpoints.parser import chunks
+
+
+def merge(results: list) -> dict:
+    """ Merge the responses of a chunked request. The data of each chunk is
+    merged, the credit counts are summed and the response is only cached if
+    every chunk was cached.
+    """
+    res = dict(results[0])
+    data = res["data"]
+    data = dict(data) if isinstance(data, dict) else list(data)
+    status = dict(res.get("status", {}))
+    for chunk in results[1:]:
+        if isinstance(data, dict):
+            data.update(chunk["data"])
+        else:
+            data.extend(chunk["data"])
+        if "credit_count" in status:
+            status["credit_count"] += chunk["status"].get("credit_count", 0)
+        if "elapsed" in status:
+            status["elapsed"] = max(
+                status["elapsed"], chunk["status"].get("elapsed", 0))
+
+    res["data"] = data
+    res["status"] = status
+    res["cached"] = all(chunk.get("cached") for chunk in results)
+    return res
+
+
+def merged(futures: list) -> Future:
+    """ Returns a future of the merged results of the chunks in "futures",
+    resolved by the last chunk without occupying a thread.
+    """
+    future = Future()
+    lock = Lock()
+    pending = [len(futures)]
+
+    def done(_):
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        try:
+            future.set_result(merge([chunk.result() for chunk in futures]))
+        except Exception as exception:
+            future.set_exception(exception)
+
+    for chunk in futures:
+        chunk.add_done_callback(done)
+    return future
+
+
+class Batch:
+    """ Batch exposes the same endpoints as the Client, but each endpoint
+    method returns a `concurrent.futures.Future` instead of the result.
+
+    Requests that are not cached are sent on a bounded thread pool and
+    throttled by the Client's throttler, cached requests are resolved
+    immediately without occupying a thread. Use "gather" to wait for every
+    result in the order the requests were made.
+
+    Parameters
+    ----------
+    client : `Client`
+        The client that sends the requests.
+    workers : `int`, optional
+        The maximum number of concurrent requests.
+    """
+
+    def __init__(self, client, workers=None):
+        self._client = client
+        self._pool = ThreadPoolExecutor(workers)
+        self._futures = []
+
+        self.cryptocurrency = Cryptocurrency(self.request)
+        self.global_metrics = GlobalMetrics(self.request)
+        self.exchange = Exchange(self.request)
+        self.tools = Tools(self.request)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, urn: str, params: dict):
+        """ Schedule a request to CoinMarketCap
+
+        Parameters
+        ----------
+        urn : `str`
+            the endpoints, E.g "cryptocurrency/info"
+        params : `dict`
+            the parameters for the request
+
+        Returns
+        -------
+        `concurrent.futures.Future`
+        """
+        split = chunks(params)
+        if len(split) > 1:
+            future = merged([self._schedule(urn, chunk) for chunk in split])
+        else:
+            future = self._schedule(urn, params)
+        self._futures.append(future)
+        return future
+
+    def _schedule(self, urn, params):
+        url = self._client._prepare(urn, params)
+        res = self._client._lookup(url)
+        if res is not None:
+            future = Future()
+            future.set_result(res)
+            return future
+
+        response = self._client._session.lookup(
+            url, self._client._policy(url))
+        if response is None:
+            return self._pool.submit(
+                self._client._flights.do, url, self._client._send, url)
+        future = Future()
+        try:
+            future.set_result(self._client._send(url, response))
+        except Exception as exception:
+            future.set_exception(exception)
+        return future
+
+    def gather(self):
+        """ Wait for all scheduled requests.
+
+        Returns
+        -------
+        `list` of `json obj`
+            The results in the same order as the requests were made.
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return [future.result() for future in self._futures]
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class Group:
+    def __init__(self, full, future):
+        self.ids = set()
+        self.full = full
+        self.future = future
+
+
+class Coalescer:
+    """ Collects concurrent single-id requests to the same endpoint with the
+    same parameters for up to "window" seconds, or until "size" ids are
+    collected, and sends them as one multi-id request. Each caller receives
+    the response with only its own id in "data".
+
+    The first caller of a group waits for the window and sends the request.
+    If the combined request fails, e.g. due to an invalid id, each caller
+    falls back to its own request.
+
+    Parameters
+    ----------
+    request : `callable`
+        Sends a request, E.g Client.request.
+    window : `float`
+        Seconds to collect ids.
+    size : `int`, optional
+        The maximum number of ids in a request.
+    """
+
+    def __init__(self, request, window, size=100):
+        self.request = request
+        self.window = window
+        self.size = size
+        self.lock = Lock()
+        self._groups = {}
+
+    @staticmethod
+    def accepts(urn, params):
+        """ `True` if the request can be coalesced. """
+        id = params.get("id")
+        return (urn.endswith(Subsets.ENDPOINTS) and id is not None
+                and "," not in str(id))
+
+    def get(self, urn, params):
+        id, key = self._key(urn, params)
+        group, leader = self._join(key, id, lambda: Group(Event(), Future()))
+        if leader:
+            group.full.wait(self.window)
+            self._leave(key, group)
+            try:
+                group.future.set_result(self._request(urn, params, group))
+            except Exception as exception:
+                group.future.set_exception(exception)
+
+        try:
+            res = group.future.result()
+        except HTTPError:
+            if len(group.ids) == 1:
+                raise
+            return self.request(urn, params)
+        if id not in res["data"]:
+            return self.request(urn, params)
+        return self._split(res, id)
+
+    def _key(self, urn, params):
+        id = str(params["id"]).strip()
+        id = str(int(id)) if id.isdigit() else id
+        key = (urn, tuple(sorted(
+            (name, str(value)) for name, value in params.items()
+            if name != "id")))
+        return id, key
+
+    def _join(self, key, id, group):
+        with self.lock:
+            leader = key not in self._groups
+            if leader:
+                self._groups[key] = group()
+            group = self._groups[key]
+            group.ids.add(id)
+            if len(group.ids) >= self.size:
+                del self._groups[key]
+                group.full.set()
+            return group, leader
+
+    def _leave(self, key, group):
+        with self.lock:
+            if self._groups.get(key) is group:
+                del self._groups[key]
+
+    def _request(self, urn, params, group):
+        return self.request(urn, dict(params, id=",".join(sorted(group.ids))))
+
+    def _split(self, res, id):
+        return dict(res, data={id: res["data"][id]})
+
+
+class AsyncCoalescer(Coalescer):
+    """ Coalescer for the AsyncClient. """
+
+    async def get(self, urn, params):
+        id, key = self._key(urn, params)
+        group, leader = self._join(key, id, lambda: Group(
+            asyncio.Event(), asyncio.get_running_loop().create_future()))
+        if leader:
+            try:
+                await self._lead(urn, params, key, group)
+            finally:
+                # a cancelled leader hands the request off to the followers
+                self._leave(key, group)
+                if not group.future.done():
+                    group.future.cancel()
+
+        try:
+            res = await asyncio.shield(group.future)
+        except asyncio.CancelledError:
+            if leader or not group.future.cancelled():
+                raise
+            return await self.request(urn, params)
+        except HTTPError:
+            if len(group.ids) == 1:
+                raise
+            return await self.request(urn, params)
+        if id not in res["data"]:
+            return await self.request(urn, params)
+        return self._split(res, id)
+
+    async def _lead(self, urn, params, key, group):
+        try:
+            await asyncio.wait_for(group.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        self._leave(key, group)
+        try:
+            group.future.set_result(await self._request(urn, params, group))
+        except Exception as exception:
+            group.future.set_exception(exception)
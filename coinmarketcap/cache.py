@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+from asyncio import CancelledError, get_running_loop, shield
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from threading import Lock, local
+from time import monotonic
+from urllib.parse import urlsplit, parse_qs, urlencode
+import sqlite3
+
+NEVER = float("inf")
+
+
+class MemoryCache:
+    """ In-process LRU cache of decoded responses keyed by url.
+
+    Entries are removed "expire" seconds after they were stored, an "expire"
+    or "maxsize" of 0 disables the cache. When the cache holds "maxsize"
+    entries, the least recently used entry is evicted.
+
+    Parameters
+    ----------
+    expire : `int`
+        Seconds for cached entries to be removed.
+    maxsize : `int`, optional
+        The maximum number of entries, `None` means unbounded.
+    """
+
+    def __init__(self, expire, maxsize=None):
+        self.expire = expire
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """ Returns the cached value of "key" or `None` if the key is missing
+        or expired.
+        """
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, expire=None):
+        """ Store "value", "expire" overrides the cache's expiration time for
+        this entry.
+        """
+        expire = self.expire if expire is None else expire
+        if expire <= 0 or self.maxsize == 0:
+            return
+        with self.lock:
+            self._entries[key] = (monotonic() + expire, value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Subsets:
+    """ Index of the multi-id responses in a MemoryCache, so a request for a
+    subset of the ids of a cached response is served from that response.
+
+    Parameters
+    ----------
+    cache : `MemoryCache`
+        The cache holding the responses.
+    """
+
+    ENDPOINTS = (
+        "cryptocurrency/info",
+        "cryptocurrency/quotes/latest",
+        "cryptocurrency/ohlcv/latest",
+        "exchange/info",
+        "exchange/quotes/latest",
+    )
+
+    def __init__(self, cache, size=16):
+        self.cache = cache
+        self.size = size
+        self.lock = Lock()
+        self._index = {}
+
+    def add(self, url, res):
+        if self.cache.maxsize == 0 or self.cache.expire <= 0:
+            return
+        group, ids = self._split(url)
+        if group is None or len(ids) < 2 or not isinstance(
+                res.get("data"), dict):
+            return
+        with self.lock:
+            entries = self._index.setdefault(group, OrderedDict())
+            entries[url] = ids
+            entries.move_to_end(url)
+            if len(entries) > self.size:
+                entries.popitem(last=False)
+
+    def get(self, url):
+        """ Returns the response for "url" built from a cached response of
+        a superset of its ids, or `None`.
+        """
+        group, ids = self._split(url)
+        if group is None:
+            return None
+        with self.lock:
+            entries = list(self._index.get(group, {}).items())
+
+        for superset, superset_ids in entries:
+            if not ids <= superset_ids:
+                continue
+            res = self.cache.get(superset)
+            if res is None:
+                with self.lock:
+                    self._index.get(group, {}).pop(superset, None)
+                continue
+            if all(id in res["data"] for id in ids):
+                data = {id: res["data"][id] for id in ids}
+                return dict(res, data=data)
+        return None
+
+    def _split(self, url):
+        url = urlsplit(url)
+        if not url.path.endswith(self.ENDPOINTS):
+            return None, None
+        params = parse_qs(url.query)
+        if "id" not in params:
+            return None, None
+        ids = frozenset(params.pop("id")[0].split(","))
+        return (url.path, urlencode(sorted(params.items()), True)), ids
+
+
+class SingleFlight:
+    """ Coalesces concurrent calls with the same key, only the first caller
+    runs the function while the others wait for its result.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args):
+        """ Returns fn(*args), or a copy of the result of the call in flight
+        for "key".
+        """
+        with self.lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return dict(call.result())
+
+        try:
+            res = fn(*args)
+            call.set_result(res)
+            return res
+        except BaseException as exception:
+            call.set_exception(exception)
+            raise
+        finally:
+            with self.lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """ SingleFlight for coroutines. """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args):
+        call = self._calls.get(key)
+        if call is not None:
+            # a cancelled follower must not cancel the call of the others
+            try:
+                return dict(await shield(call))
+            except CancelledError:
+                if not call.cancelled():
+                    raise
+            # the leader was cancelled, run the call again
+            return await self.do(key, fn, *args)
+
+        call = self._calls[key] = get_running_loop().create_future()
+        try:
+            res = await fn(*args)
+            if not call.done():
+                call.set_result(res)
+            return res
+        except CancelledError:
+            call.cancel()
+            raise
+        except BaseException as exception:
+            if not call.done():
+                call.set_exception(exception)
+                # mark the exception as retrieved in case nobody is waiting
+                call.exception()
+            raise
+        finally:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+
+class Policy:
+    """ Expiration time of a request depending on its endpoint and params.
+
+    Historical requests and price conversions ending in the past never
+    change, so they never expire. Other requests expire after the seconds
+    of the first rule whose pattern matches the endpoint, or after "expire"
+    seconds if none matches.
+
+    Parameters
+    ----------
+    expire : `int`
+        Seconds for requests matching no rule to expire.
+    rules : `dict`, optional
+        Seconds to expire by endpoint pattern (fnmatch), matched against the
+        endpoint without the API root, E.g {"*/latest": 60,
+        "cryptocurrency/info": 3600}. `None` uses the default rules, an
+        empty dict gives every request the same expiration time.
+    root : `str`, optional
+        The path of the API root in the urls.
+    """
+
+    RULES = {
+        "*/latest": 60,
+        "*/info": 86400,
+        "*/map": 86400,
+    }
+
+    def __init__(self, expire, rules=None, root="/v1/"):
+        self.expire = expire
+        self.rules = self.RULES if rules is None else rules
+        self.root = root
+
+    def __call__(self, url):
+        """ Returns the seconds before the response of "url" expires,
+        NEVER if it is immutable.
+        """
+        url = urlsplit(url)
+        if self.rules:
+            params = parse_qs(url.query)
+            end = None
+            if url.path.endswith("historical"):
+                end = params.get("time_end")
+            elif url.path.endswith("price-conversion"):
+                end = params.get("time")
+            if end and _past(end[0]):
+                return NEVER
+
+        urn = url.path
+        if urn.startswith(self.root):
+            urn = urn[len(self.root):]
+        for pattern, expire in self.rules.items():
+            if fnmatch(urn, pattern):
+                return expire
+        return self.expire
+
+
+def _past(time):
+    try:
+        time = datetime.fromisoformat(time.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if time.tzinfo is None:
+        return time < datetime.now()
+    return time < datetime.now(timezone.utc)
+
+
+class Connections:
+    """ One connection per thread to the sqlite database at "path", so the
+    threads don't share a transaction. Calling it returns the connection of
+    the calling thread.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the sqlite database.
+    **options
+        Keyword arguments of sqlite3.connect.
+    """
+
+    def __init__(self, path, **options):
+        self.path = path
+        self.options = options
+        self.lock = Lock()
+        self.local = local()
+        self._all = []
+
+    def __call__(self):
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=60,
+                                  check_same_thread=False, **self.options)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+            with self.lock:
+                self._all.append(con)
+        return con
+
+    def close(self):
+        """ Close the connections of every thread. """
+        with self.lock:
+            for con in self._all:
+                con.close()
+            self._all.clear()
+        self.local = local()
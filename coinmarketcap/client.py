@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
 
 from requests import Request
-from json import loads
+import asyncio
 from os.path import join as urljoin
 from requests.exceptions import HTTPError
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Union
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
 # local
+from . import arrays
+from .batch import Batch, Coalescer, AsyncCoalescer, merge
 from .endpoints import Cryptocurrency, Exchange, GlobalMetrics, Tools
-from .environment import Sandbox, Production, Throttler
+from .endpoints.parser import canonical, chunks
+from .history import History, series, windows
+from .resolver import Resolver
+from .stream import Items, Stream, path
+from .cache import SingleFlight, AsyncSingleFlight
+from .environment import Sandbox, Production, KeyPool, HEADER, credits, store
+from .environment import local_path
+from .environment import AsyncSandbox, AsyncProduction, AsyncKeyPool
 
 
 class Client(Sandbox, Production):
@@ -21,9 +38,11 @@ class Client(Sandbox, Production):
 
     Parameters
     ----------
-    apikey : `str`, optional
+    apikey : `str` or `list` of `str`, optional
         The API key to CoinMarketCap can be loaded in several ways.
-        1. passed as argument
+        1. passed as argument, pass a list of keys to spread the requests
+        over several keys. Each request is sent with the key that has the
+        most remaining budget, while all keys share the same cache.
         2. try to laod $HOME/.coinmarketcap.json. keys are:
         {"sandbox": "API_KEY", "production": "API_KEY"}
         3. check COINMARKETCAP_{SANDBOX or PRODUCTION} environment variables.
@@ -33,17 +52,57 @@ class Client(Sandbox, Production):
         Init coinmarketcap sandbox environment.
     throttle : `str`, optional
         Throttle coinmarketcap requests are a bit weird due to their
-        levels of requests limitations.
-        Valid values: {"minute", "daily", "monthly"}
-    plan : `str`, optional
+        levels of requests limitations. "credits" throttles by the call
+        credits of each request against the minute, daily and monthly
+        limits of the plan at once.
+        Valid values: {"minute", "daily", "monthly", "credits"}
+    plan : `str` or `list` of `str`, optional
         Since the API do not provide any metadata regarding accounts,
         you need to pass the correct plan if and only if throttling of
-        requests are activated.
+        requests are activated. Pass a list with one plan for each API key
+        if the keys have different plans.
         Valid values: {"basic", "hobbyist", "startup", "standard",
         "professional", "enterprise"}. If you have passed the "enterprise",
         be sure to set your own params for requests using the method "plan".
     block : `str`, optional
-        block if the request limit is exceeded.
+        block if the request limit is exceeded, otherwise requests exceeding
+        the limit raise ratelimit.RateLimitException.
+    shared : `bool` or `str`, optional
+        Share the throttling budget of each API key with every client in
+        every process on the host. The state is kept in a sqlite database,
+        pass a path to the database or `True` to use one in the temp dir.
+    memory : `int`, optional
+        Keep up to "memory" decoded responses in an in-process LRU cache in
+        front of the sqlite cache, with the same expiration time. Responses
+        from the memory cache share nested objects, don't mutate them.
+    policy : `bool` or `dict`, optional
+        Expiration times by endpoint instead of one "expire" for every
+        request. `True` uses the default rules: latest data expires after
+        60 seconds, info and map after a day, and historical data ending in
+        the past never expires. A dict sets the seconds by endpoint pattern,
+        E.g {"*/latest": 30, "cryptocurrency/info": 3600}, and other
+        endpoints expire after "expire" seconds.
+    coalesce : `float`, optional
+        Collect concurrent single-id requests to the info and latest quotes
+        and OHLCV endpoints for "coalesce" seconds, E.g 0.005, and send them
+        as one multi-id request. Each caller receives only its own id.
+    history : `bool` or `str`, optional
+        Keep the series of the historical endpoints in a local store queried
+        with "client.history", which only requests the ranges it doesn't
+        hold. Pass a path to the sqlite database or `True` to use one in the
+        temp dir.
+    resolve : `bool` or `str`, optional
+        Resolve cryptocurrency symbols and exchange slugs to ids with a local
+        index, so requests by symbol or slug are sent and cached by id. Pass
+        a path to the index file or `True` to use one in the temp dir.
+    backend : `str`, optional
+        Storage of the sqlite cache. "sqlite" keeps the pickled responses,
+        "compressed" keeps only the decoded bodies compressed with zstd (if
+        zstandard is installed) or zlib and a shared JSON dictionary, which
+        takes a fraction of the disk and I/O per hit. "concurrent" stores
+        the compressed bodies in sharded sqlite databases in WAL mode with
+        batched writes, for many threads and processes sharing the cache.
+        Valid values: {"sqlite", "compressed", "concurrent"}
 
     Raises
     ------
@@ -60,17 +119,38 @@ class Client(Sandbox, Production):
         sandbox=False,
         throttle=None,
         block=True,
+        shared=False,
+        memory=0,
+        policy=False,
+        coalesce=None,
+        history=False,
+        resolve=False,
+        backend="sqlite",
     ):
         if sandbox:
-            Sandbox.__init__(self, apikey, expire)
+            Sandbox.__init__(self, apikey, expire, memory, policy, backend)
         else:
-            Production.__init__(self, apikey, expire)
+            Production.__init__(self, apikey, expire, memory, policy, backend)
 
         self.cryptocurrency = Cryptocurrency(self.request)
         self.global_metrics = GlobalMetrics(self.request)
         self.exchange = Exchange(self.request)
         self.tools = Tools(self.request)
-        self._throttler = Throttler(plan, throttle, block)
+        self._throttler = KeyPool(
+            self._apikeys, plan, throttle, block, store(shared))
+        self._flights = SingleFlight()
+        self._coalescer = None
+        if coalesce:
+            self._coalescer = Coalescer(self._request, coalesce)
+        self.streaming = Stream(self.stream)
+        self.history = None
+        if history:
+            self.history = History(
+                self, local_path(history, sandbox, "history.sqlite"))
+        self._resolver = None
+        if resolve:
+            self._resolver = Resolver(
+                self, local_path(resolve, sandbox, "index.json.gz"))
 
     def request(self, urn: str, params: dict):
         """ Send a request to CoinMarketCap
@@ -87,27 +167,241 @@ class Client(Sandbox, Production):
         requests.exceptions.HTTPError
             If status code is not 200
         """
-        url = Request("GET", urljoin(self._url, urn),
-                      params=params).prepare().url
-        # NOTE: race condition, but it should be harmless
-        if self._session.cache.has_url(url):
-            response = self._request_cache(url)
-        else:
-            response = self._request_throttle(url)
+        if self._resolver is not None:
+            resolved = self._resolver.resolve(urn, params)
+            if resolved is not None:
+                return self._resolver.rekey(
+                    urn, self.request(urn, resolved[0]), resolved[1])
+
+        split = chunks(params)
+        if len(split) > 1:
+            with self.batch(len(split)) as batch:
+                return batch.request(urn, params).result()
+
+        if self._coalescer is not None and self._coalescer.accepts(
+                urn, params):
+            url = self._prepare(urn, params)
+            res = self._lookup(url)
+            if res is not None:
+                return res
+            return self._coalescer.get(urn, params)
+        return self._request(urn, params)
+
+    def _request(self, urn, params):
+        url = self._prepare(urn, params)
+        res = self._lookup(url)
+        if res is not None:
+            return res
+        return self._flights.do(url, self._fetch, url)
+
+    def stream(self, urn: str, params: dict, chunk_size=65536):
+        """ Send a request to CoinMarketCap and iterate over the records of
+        "data", or "data.market_pairs" for market pairs, while the response
+        is read. Each record is parsed as soon as it has been received, so
+        the memory is bounded by one record instead of the whole response.
+        Streamed requests are throttled but not cached.
+
+        The endpoints of "client.streaming" stream their records,
+        E.g client.streaming.cryptocurrency.listings.latest_start(limit=5000)
+
+        Parameters
+        ----------
+        urn : `str`
+            the endpoints, E.g "cryptocurrency/listings/latest"
+        params : `dict`
+            the parameters for the request
+        chunk_size : `int`, optional
+            The number of bytes read at a time.
+
+        Returns
+        -------
+        `generator` of `json obj`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        ValueError
+            If the response has no array of records.
+        """
+        url = self._prepare(urn, params)
+        cost = credits(url)
+        apikey = self._throttler.throttle(cost)
+        items = Items(path(urn))
+        with self.stream_session().get(
+                url, headers={HEADER: apikey}, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size):
+                yield from items.feed(chunk)
+        items.close()
+        self._throttler.reconcile(apikey, cost, items.values)
+
+    def batch(self, workers=None):
+        """ Returns a Batch with the same endpoints as the Client, where each
+        request is sent concurrently on a thread pool with at most "workers"
+        threads. All requests share the Client's cache and throttler.
+
+        Parameters
+        ----------
+        workers : `int`, optional
+            The maximum number of concurrent requests.
+
+        Returns
+        -------
+        `Batch`
+        """
+        return Batch(self, workers)
 
-        res = loads(response.text)
+    def gather(self, calls: list, workers=None):
+        """ Send many requests concurrently and return the results in the
+        same order as "calls".
+
+        Parameters
+        ----------
+        calls : `list` of `callable`
+            Each callable receives a Batch and calls one of its endpoints.
+            Example: [lambda c: c.exchange.info.ids([1, 2]),
+                      lambda c: c.cryptocurrency.quotes.latest_ids(1)]
+        workers : `int`, optional
+            The maximum number of concurrent requests.
+
+        Returns
+        -------
+        `list` of `json obj`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        with self.batch(workers) as batch:
+            for call in calls:
+                call(batch)
+            return batch.gather()
+
+    def backfill(
+        self,
+        id: Union[list, str, int],
+        time_start,
+        time_end=None,
+        time_period="daily",
+        interval="daily",
+        convert="USD",
+        workers=None,
+        array=False,
+    ):
+        """ Returns the historical OHLCV of each cryptocurrency between
+        "time_start" and "time_end", beyond the 10000 bars limit of a single
+        request.
+
+        The span is split into windows of at most 10000 bars, which are
+        requested concurrently on a thread pool under the Client's throttler.
+        The windows of each cryptocurrency are joined into one series ordered
+        by time without duplicate bars.
+
+        Parameters
+        ----------
+        id : `int`, `str` or `list` of `str` or `int`
+            One or a list of CoinMarketCap cryptocurrency ids.
+        time_start : `datetime.datetime`, `float` or `str`
+            Timestamp (datetime, Unix, ISO 8601 str) to start returning OHLCV
+            time periods for (exclusive).
+        time_end : `datetime.datetime`, `float` or `str`, optional
+            Timestamp (datetime, Unix, ISO 8601 str) to stop returning OHLCV
+            time periods for (inclusive), defaults to the current time.
+        time_period : `str`, optional
+            Valid values: {"daily", "hourly"}.
+        interval : `str`, optional
+            See cryptocurrency.ohlcv.historical_id.
+        convert : `str`, optional
+            Calculate market quotes in another fiat currency or cryptocurrency.
+        workers : `int`, optional
+            The maximum number of concurrent requests.
+        array : `bool`, optional
+            Return each series as a NumPy structured array, see
+            coinmarketcap.arrays.ohlcv. Requires numpy.
+
+        Returns
+        -------
+        `dict`
+            The "data" of cryptocurrency.ohlcv.historical_id by id, with the
+            bars of every window in "quotes".
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        ids, spans = self._windows(id, time_start, time_end, time_period,
+                                   interval)
+        with self.batch(workers) as batch:
+            for i in ids:
+                for start, end, count in spans:
+                    batch.cryptocurrency.ohlcv.historical_id(
+                        i, start, end, time_period, count, interval, convert)
+            results = batch.gather()
+        return self._series(ids, spans, results, convert, array)
+
+    @staticmethod
+    def _windows(id, time_start, time_end, time_period, interval):
+        ids = id if isinstance(id, list) else [id]
+        if time_end is None:
+            time_end = datetime.now(timezone.utc)
+        return ids, windows(time_start, time_end, time_period, interval)
+
+    @staticmethod
+    def _series(ids, spans, results, convert, array):
+        n = len(spans)
+        res = {str(i): series(results[j * n:(j + 1) * n])
+               for j, i in enumerate(ids)}
+        if array:
+            res = {i: arrays.ohlcv(data, convert) for i, data in res.items()}
+        return res
+
+    def _prepare(self, urn, params):
+        return Request("GET", urljoin(self._url, urn),
+                       params=canonical(params)).prepare().url
+
+    def _fetch(self, url):
+        return self._send(url, self._session.lookup(url, self._policy(url)))
+
+    def _lookup(self, url):
+        res = self._memory.get(url) or self._subsets.get(url)
+        if res is not None:
+            return dict(res, cached=True)
+        return None
+
+    def _remember(self, url, res, response):
+        expire = self._policy(url)
+        if response.from_cache and "Date" in response.headers:
+            date = parsedate_to_datetime(response.headers["Date"])
+            expire -= (datetime.now(timezone.utc) - date).total_seconds()
+        self._memory.set(url, dict(res), expire)
+        self._subsets.add(url, res)
+
+    def _send(self, url, response=None):
+        """ Decode the cached "response", or send a throttled request. """
+        cost = credits(url)
+        if response is None:
+            response = self._request_throttle(url, cost)
+
+        res = loads(response.content)
+        if not response.from_cache:
+            apikey = response.request.headers.get(HEADER)
+            self._throttler.reconcile(apikey, cost, res)
         if response.status_code == 200:
+            self._remember(url, res, response)
             res["cached"] = response.from_cache
             return res
         else:
             raise response.raise_for_status()
 
-    def _request_cache(self, url):
-        return self._session.get(url)
-
-    def _request_throttle(self, url):
-        self._throttler.throttle()
-        return self._session.get(url)
+    def _request_throttle(self, url, cost=1):
+        apikey = self._throttler.throttle(cost)
+        return self._session.get(
+            url, expire=self._policy(url), headers={HEADER: apikey})
 
     @property
     def plan(self):
@@ -116,3 +410,248 @@ class Client(Sandbox, Production):
     @plan.setter
     def plan(self, minute=0, daily=0, monthly=0):
         self._throttler.plan(minute, daily, monthly)
+
+
+class AsyncClient(AsyncSandbox, AsyncProduction):
+    """ AsyncClient is the asyncio counterpart of the Client. It exposes the
+    same endpoints -> cryptocurrency, exchange, global-metrics and tools,
+    but every endpoint method returns an awaitable.
+
+    Requests are sent with aiohttp, cached in memory and throttled without
+    blocking the event loop. The AsyncClient should be closed when it is no
+    longer needed, either with "await client.close()" or by using it as an
+    async context manager.
+
+    Parameters
+    ----------
+    apikey : `str`, optional
+        See Client.
+    expire : `int`, optional
+        Seconds for cached requests to be removed.
+    sandbox : `bool`, optional
+        Init coinmarketcap sandbox environment.
+    throttle : `str`, optional
+        See Client. Valid values: {"minute", "daily", "monthly", "credits"}
+    plan : `str`, optional
+        See Client.
+    block : `str`, optional
+        block if the request limit is exceeded.
+    shared : `bool` or `str`, optional
+        See Client.
+    memory : `int`, optional
+        The maximum number of cached responses, the least recently used
+        response is evicted first. `None` means unbounded, expired responses
+        are only removed when they are requested again.
+    policy : `bool` or `dict`, optional
+        See Client.
+    coalesce : `float`, optional
+        See Client.
+
+    Raises
+    ------
+    ValueError
+        If one of the arguments could not be parsed.
+
+    """
+
+    def __init__(
+        self,
+        apikey=None,
+        expire=3600,
+        plan="basic",
+        sandbox=False,
+        throttle=None,
+        block=True,
+        shared=False,
+        memory=1024,
+        policy=False,
+        coalesce=None,
+    ):
+        if sandbox:
+            AsyncSandbox.__init__(self, apikey, expire, memory, policy)
+        else:
+            AsyncProduction.__init__(self, apikey, expire, memory, policy)
+
+        self.cryptocurrency = Cryptocurrency(self.request)
+        self.global_metrics = GlobalMetrics(self.request)
+        self.exchange = Exchange(self.request)
+        self.tools = Tools(self.request)
+        self._throttler = AsyncKeyPool(
+            self._apikeys, plan, throttle, block, store(shared))
+        self._flights = AsyncSingleFlight()
+        self._coalescer = None
+        if coalesce:
+            self._coalescer = AsyncCoalescer(self._request, coalesce)
+        self.streaming = Stream(self.stream)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, urn: str, params: dict):
+        """ Send a request to CoinMarketCap
+
+        Parameters
+        ----------
+        urn : `str`
+            the endpoints, E.g "cryptocurrency/info"
+        params : `dict`
+            the parameters for the request
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        split = chunks(params)
+        if len(split) > 1:
+            return merge(await asyncio.gather(
+                *[self._request(urn, chunk) for chunk in split]))
+
+        if self._coalescer is not None and self._coalescer.accepts(
+                urn, params):
+            res = self._lookup(self._prepare(urn, params))
+            if res is not None:
+                return res
+            return await self._coalescer.get(urn, params)
+        return await self._request(urn, params)
+
+    async def _request(self, urn, params):
+        url = self._prepare(urn, params)
+        res = self._lookup(url)
+        if res is not None:
+            return res
+        return await self._flights.do(url, self._fetch, url)
+
+    async def stream(self, urn: str, params: dict, chunk_size=65536):
+        """ Send a request to CoinMarketCap and iterate with "async for" over
+        the records while the response is read, see Client.stream.
+
+        Parameters
+        ----------
+        urn : `str`
+            the endpoints, E.g "cryptocurrency/listings/latest"
+        params : `dict`
+            the parameters for the request
+        chunk_size : `int`, optional
+            The number of bytes read at a time.
+
+        Returns
+        -------
+        `async_generator` of `json obj`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        ValueError
+            If the response has no array of records.
+        """
+        url = self._prepare(urn, params)
+        cost = credits(url)
+        apikey = await self._throttler.throttle(cost)
+        items = Items(path(urn))
+        session = await self.session()
+        async with session.get(url, headers={HEADER: apikey}) as response:
+            if response.status != 200:
+                raise HTTPError(
+                    "%s Error: %s for url: %s"
+                    % (response.status, response.reason, url)
+                )
+            async for chunk in response.content.iter_chunked(chunk_size):
+                for item in items.feed(chunk):
+                    yield item
+        items.close()
+        self._throttler.reconcile(apikey, cost, items.values)
+
+    async def backfill(
+        self,
+        id: Union[list, str, int],
+        time_start,
+        time_end=None,
+        time_period="daily",
+        interval="daily",
+        convert="USD",
+        array=False,
+    ):
+        """ Returns the historical OHLCV of each cryptocurrency between
+        "time_start" and "time_end", beyond the 10000 bars limit of a single
+        request.
+
+        The span is split into windows of at most 10000 bars, which are
+        requested concurrently under the AsyncClient's throttler. The windows
+        of each cryptocurrency are joined into one series ordered by time
+        without duplicate bars.
+
+        Parameters
+        ----------
+        id : `int`, `str` or `list` of `str` or `int`
+            One or a list of CoinMarketCap cryptocurrency ids.
+        time_start : `datetime.datetime`, `float` or `str`
+            Timestamp (datetime, Unix, ISO 8601 str) to start returning OHLCV
+            time periods for (exclusive).
+        time_end : `datetime.datetime`, `float` or `str`, optional
+            Timestamp (datetime, Unix, ISO 8601 str) to stop returning OHLCV
+            time periods for (inclusive), defaults to the current time.
+        time_period : `str`, optional
+            Valid values: {"daily", "hourly"}.
+        interval : `str`, optional
+            See cryptocurrency.ohlcv.historical_id.
+        convert : `str`, optional
+            Calculate market quotes in another fiat currency or cryptocurrency.
+        array : `bool`, optional
+            See Client.backfill.
+
+        Returns
+        -------
+        `dict`
+            The "data" of cryptocurrency.ohlcv.historical_id by id, with the
+            bars of every window in "quotes".
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        ids, spans = Client._windows(id, time_start, time_end, time_period,
+                                     interval)
+        results = await asyncio.gather(*[
+            self.cryptocurrency.ohlcv.historical_id(
+                i, start, end, time_period, count, interval, convert)
+            for i in ids for start, end, count in spans])
+        return Client._series(ids, spans, results, convert, array)
+
+    def _prepare(self, urn, params):
+        return Request("GET", urljoin(self._url, urn),
+                       params=canonical(params)).prepare().url
+
+    def _lookup(self, url):
+        res = self._cache.get(url) or self._subsets.get(url)
+        if res is not None:
+            return dict(res, cached=True)
+        return None
+
+    async def _fetch(self, url):
+        cost = credits(url)
+        apikey = await self._throttler.throttle(cost)
+        session = await self.session()
+        async with session.get(url, headers={HEADER: apikey}) as response:
+            res = loads(await response.read())
+            self._throttler.reconcile(apikey, cost, res)
+            if response.status == 200:
+                self._cache.set(url, res, self._policy(url))
+                self._subsets.add(url, res)
+                return dict(res, cached=False)
+            else:
+                raise HTTPError(
+                    "%s Error: %s for url: %s"
+                    % (response.status, response.reason, url)
+                )
+
+    @property
+    def plan(self):
+        return self._throttler.plan
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+from threading import Lock
+from time import monotonic
+
+
+class Converter:
+    """ Converts amounts between cryptocurrencies and a quote currency in
+    memory, with the prices of one listings or quotes snapshot instead of a
+    tools/price-conversion request for each conversion.
+
+    The snapshot is refreshed when it is older than "expire" seconds. Each
+    refresh costs one call credit per 100 cryptocurrencies, so the defaults
+    cost 1 credit every 5 minutes, 288 a day, within the daily limit of
+    every plan. A snapshot of 5000 cryptocurrencies refreshed every minute
+    would cost 72000 credits a day. Cryptocurrencies missing from the
+    snapshot are converted with tools/price-conversion, 1 credit each.
+
+    Parameters
+    ----------
+    client : `Client`
+        The client that requests the snapshots.
+    convert : `str`, optional
+        The quote currency of the snapshot, E.g "USD".
+    ids : `list` of `int`, optional
+        Take the snapshot with quotes/latest of these cryptocurrencies,
+        otherwise with the "limit" first of listings/latest.
+    limit : `int`, optional
+        The number of cryptocurrencies of the listings snapshot.
+    expire : `int`, optional
+        Seconds until the snapshot is refreshed.
+    """
+
+    def __init__(self, client, convert="USD", ids=None, limit=100,
+                 expire=300):
+        self.client = client
+        self.convert = convert
+        self.ids = ids
+        self.limit = limit
+        self.expire = expire
+        self.lock = Lock()
+        self.prices = {}
+        self.symbols = {}
+        self.updated = None
+
+    def convert_id(self, amount, id, convert_id=None) -> float:
+        """ Convert an amount of a cryptocurrency into the quote currency or
+        into another cryptocurrency.
+
+        Parameters
+        ----------
+        amount : `int`, `float` or `str`
+            An amount of the cryptocurrency.
+        id : `int` or `str`
+            The CoinMarketCap id of the cryptocurrency to convert from.
+        convert_id : `int` or `str`, optional
+            The CoinMarketCap id of the cryptocurrency to convert to, the
+            quote currency if `None`.
+
+        Returns
+        -------
+        `float`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If a request for a snapshot or a conversion fails.
+        """
+        value = float(amount) * self._price(int(id))
+        if convert_id is None:
+            return value
+        return value / self._price(int(convert_id))
+
+    def convert_symbol(self, amount, symbol, convert=None) -> float:
+        """ Convert an amount between the symbols of cryptocurrencies and the
+        quote currency.
+
+        Parameters
+        ----------
+        amount : `int`, `float` or `str`
+            An amount of the currency.
+        symbol : `str`
+            The symbol to convert from, E.g "BTC" or the quote currency.
+        convert : `str`, optional
+            The symbol to convert to, the quote currency if `None`.
+
+        Returns
+        -------
+        `float`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If a request for a snapshot or a conversion fails.
+        """
+        value = float(amount) * self._symbol_price(symbol)
+        if convert is None:
+            return value
+        return value / self._symbol_price(convert)
+
+    def refresh(self):
+        """ Take a new snapshot of the prices. """
+        if self.ids is not None:
+            res = self.client.cryptocurrency.quotes.latest_ids(
+                self.ids, self.convert)
+            data = res["data"].values()
+        else:
+            res = self.client.cryptocurrency.listings.latest_start(
+                1, self.limit, self.convert)
+            data = res["data"]
+
+        prices, symbols = {}, {}
+        for coin in data:
+            price = coin["quote"][self.convert]["price"]
+            if price:
+                prices[coin["id"]] = price
+                symbols.setdefault(coin["symbol"].upper(), coin["id"])
+        with self.lock:
+            self.prices, self.symbols = prices, symbols
+            self.updated = monotonic()
+
+    def _snapshot(self):
+        if self.updated is None or monotonic() - self.updated > self.expire:
+            self.refresh()
+        with self.lock:
+            return self.prices, self.symbols
+
+    def _price(self, id):
+        price = self._snapshot()[0].get(id)
+        if price is None:
+            res = self.client.tools.price.convert_id(
+                1, id, convert=self.convert)
+            price = res["data"]["quote"][self.convert]["price"]
+        return price
+
+    def _symbol_price(self, symbol):
+        symbol = symbol.upper()
+        if symbol == self.convert.upper():
+            return 1.0
+        prices, symbols = self._snapshot()
+        id = symbols.get(symbol)
+        if id is not None:
+            return prices[id]
+        res = self.client.tools.price.convert_symbol(
+            1, symbol, convert=self.convert)
+        return res["data"]["quote"][self.convert]["price"]
+
+
+class CrossRates:
+    """ Dense matrix of the prices of N cryptocurrencies in M currencies,
+    built from one quotes snapshot in a single "base" currency instead of a
+    convert option, and a call credit, for each currency.
+
+    The currencies are anchored to the base currency with the snapshot for
+    cryptocurrencies in it, and with one tools/price-conversion request for
+    the other fiat and cryptocurrencies, which is refreshed less often.
+    Requires numpy.
+
+    Parameters
+    ----------
+    client : `Client`
+        The client that requests the snapshots.
+    ids : `list` of `int`
+        The CoinMarketCap ids of the cryptocurrencies, the rows.
+    converts : `list` of `str`
+        The symbols of the fiat and cryptocurrencies, the columns.
+    base : `str`, optional
+        The currency of the snapshot.
+    expire : `int`, optional
+        Seconds until the snapshot is refreshed.
+    anchors_expire : `int`, optional
+        Seconds until the rates of currencies outside the snapshot are
+        refreshed.
+    """
+
+    def __init__(self, client, ids, converts, base="USD", expire=60,
+                 anchors_expire=3600):
+        self.client = client
+        self.ids = [int(id) for id in ids]
+        self.converts = [convert.upper() for convert in converts]
+        self.base = base.upper()
+        self.expire = expire
+        self.anchors_expire = anchors_expire
+        self.lock = Lock()
+        self.rows = {id: i for i, id in enumerate(self.ids)}
+        self.columns = {convert: j for j, convert in enumerate(self.converts)}
+        self.anchors = {}
+        self.matrix = None
+        self.updated = None
+        self.anchored = None
+
+    def rate(self, id, convert: str) -> float:
+        """ The price of the cryptocurrency "id" in "convert". """
+        return float(self.rates()[self.rows[int(id)],
+                                  self.columns[convert.upper()]])
+
+    def rates(self):
+        """ Returns the N×M matrix, the price of the cryptocurrency of each
+        row in the currency of each column. The matrix is refreshed when it
+        is older than "expire" seconds.
+
+        Returns
+        -------
+        `numpy.ndarray`
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If a request for a snapshot fails.
+        """
+        with self.lock:
+            stale = self.updated is None or (
+                monotonic() - self.updated > self.expire)
+            if stale:
+                self.refresh()
+            return self.matrix
+
+    def refresh(self):
+        """ Take a new snapshot and rebuild the matrix. """
+        import numpy as np
+
+        res = self.client.cryptocurrency.quotes.latest_ids(
+            self.ids, self.base)
+        prices = np.full(len(self.ids), np.nan)
+        symbols = {}
+        for id, coin in res["data"].items():
+            price = coin["quote"][self.base]["price"]
+            prices[self.rows[int(id)]] = np.nan if price is None else price
+            symbols.setdefault(coin["symbol"].upper(), price)
+
+        missing = [c for c in self.converts
+                   if c != self.base and c not in symbols]
+        stale = self.anchored is None or (
+            monotonic() - self.anchored > self.anchors_expire)
+        if missing and stale:
+            res = self.client.tools.price.convert_symbol(
+                1, self.base, convert=missing)
+            self.anchors = {convert: 1 / quote["price"]
+                            for convert, quote in res["data"]["quote"].items()
+                            if quote["price"]}
+            self.anchored = monotonic()
+
+        anchors = np.array([self._anchor(c, symbols) for c in self.converts])
+        self.matrix = prices[:, None] / anchors[None, :]
+        self.updated = monotonic()
+
+    def _anchor(self, convert, symbols):
+        """ The price of one unit of "convert" in the base currency. """
+        if convert == self.base:
+            return 1.0
+        price = symbols.get(convert) or self.anchors.get(convert)
+        return float("nan") if price is None else price
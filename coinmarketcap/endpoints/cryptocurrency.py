@@ -6,6 +6,7 @@ import datetime
 
 # local
 from .parser import args
+from .pages import Pages
 
 
 class Info:
@@ -102,6 +103,33 @@ class Map:
         """
         return self.request(args(**locals()))
 
+    def iter_active(self, start=1, limit=5000, prefetch=0):
+        """ Iterates over all active cryptocurrencies page by page and yields
+        one cryptocurrency at a time.
+
+        Parameters
+        ----------
+        start : `int`, optional
+            Start (1-based index) of the first item to return.
+        limit : `int`, optional
+            The number of items of each page.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1CryptocurrencyMap
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.active_start(x, limit), start, limit,
+                     prefetch=prefetch)
+
     def active_symbols(self, symbol: Union[list, str]):
         """ Returns a list of all active cryptocurrencies by CoinMarketCap ID.
         It is recommended to use endpoint to lookup and utilize unique
@@ -223,6 +251,48 @@ class Listings:
         """
         return self.request("latest", locals())
 
+    def iter_latest(
+        self,
+        start=1,
+        limit=5000,
+        convert="USD",
+        sort="market_cap",
+        sort_dir="desc",
+        cryptocurrency_type="all",
+        prefetch=0,
+    ):
+        """ Iterates over all cryptocurrencies with latest market data page by
+        page and yields one cryptocurrency at a time.
+
+        Parameters
+        ----------
+        start : `int`, optional
+            Start (1-based index) of the first item to return.
+        limit : `int`, optional
+            The number of items of each page.
+        convert, sort, sort_dir, cryptocurrency_type : optional
+            See latest_start.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1CryptocurrencyListingsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(
+            lambda x: self.latest_start(
+                x, limit, convert, sort, sort_dir, cryptocurrency_type),
+            start, limit, prefetch=prefetch)
+
 
 class Pairs:
     """ Lists all market pairs across all exchanges for the specified
@@ -308,6 +378,77 @@ class Pairs:
         """
         return self.request(locals())
 
+    def iter_id(
+        self, id: Union[str, int], start=1, limit=5000, convert="USD",
+        prefetch=0,
+    ):
+        """ Iterates over all market pairs of the specified cryptocurrency
+        page by page and yields one market pair at a time.
+
+        Parameters
+        ----------
+        id : `int` or `str`
+            See id.
+        start : `int`, optional
+            Start (1-based index) of the first market pair to return.
+        limit : `int`, optional
+            The number of market pairs of each page.
+        convert : `str` or `list` of `str`, optional
+            See id.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1CryptocurrencyMarketpairsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.id(id, x, limit, convert),
+                     start, limit, "market_pairs", prefetch)
+
+    def iter_symbol(
+        self, symbol: str, start=1, limit=5000, convert="USD", prefetch=0,
+    ):
+        """ Iterates over all market pairs of the specified cryptocurrency
+        page by page and yields one market pair at a time.
+
+        Parameters
+        ----------
+        symbol : `str`
+            See symbol.
+        start : `int`, optional
+            Start (1-based index) of the first market pair to return.
+        limit : `int`, optional
+            The number of market pairs of each page.
+        convert : `str` or `list` of `str`, optional
+            See symbol.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1CryptocurrencyMarketpairsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.symbol(symbol, x, limit, convert),
+                     start, limit, "market_pairs", prefetch)
+
 
 class Ohlcv:
     """ Return historical and latest OHLCV (Open, High, Low, Close, Volume) data
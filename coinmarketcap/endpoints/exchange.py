@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from .parser import args
+from .pages import Pages
 from typing import Union
 from os.path import join as urljoin
 
@@ -96,6 +97,33 @@ class Map:
         """
         return self.request(args(**locals()))
 
+    def iter_active(self, start=1, limit=5000, prefetch=0):
+        """ Iterates over all active cryptocurrency exchanges page by page
+        and yields one exchange at a time.
+
+        Parameters
+        ----------
+        start : `int`, optional
+            Start (1-based index) of the first item to return.
+        limit : `int`, optional
+            The number of items of each page.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1ExchangeMap
+
+        Raises
+        ------
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.active_start(x, limit), start, limit,
+                     prefetch=prefetch)
+
     def active_slugs(self, slug: Union[list, str]):
         """ Returns a list of all cryptocurrency exchanges by CoinMarketCap ID.
         It is recommended to use this endpoint to lookup and utilize exchange
@@ -224,6 +252,48 @@ class Listings:
         """
         return self.request("latest", locals())
 
+    def iter_latest(
+        self,
+        start=1,
+        limit=5000,
+        sort="volume_24h",
+        sort_dir="desc",
+        market_type="all",
+        convert="USD",
+        prefetch=0,
+    ):
+        """ Iterates over all cryptocurrency exchanges with latest market data
+        page by page and yields one exchange at a time.
+
+        Parameters
+        ----------
+        start : `int`, optional
+            Start (1-based index) of the first item to return.
+        limit : `int`, optional
+            The number of items of each page.
+        sort, sort_dir, market_type, convert : optional
+            See latest_start.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1ExchangeListingsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(
+            lambda x: self.latest_start(
+                x, limit, sort, sort_dir, market_type, convert),
+            start, limit, prefetch=prefetch)
+
 
 class Pairs:
     """
@@ -305,6 +375,77 @@ class Pairs:
         """
         return self.request(locals())
 
+    def iter_id(
+        self, id: Union[str, int], start=1, limit=5000, convert="USD",
+        prefetch=0,
+    ):
+        """ Iterates over all market pairs of the specified exchange page by
+        page and yields one market pair at a time.
+
+        Parameters
+        ----------
+        id : `int` or `str`
+            See id.
+        start : `int`, optional
+            Start (1-based index) of the first market pair to return.
+        limit : `int`, optional
+            The number of market pairs of each page.
+        convert : `str` or `list` of `str`, optional
+            See id.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1ExchangeMarketpairsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.id(id, x, limit, convert),
+                     start, limit, "market_pairs", prefetch)
+
+    def iter_slug(
+        self, slug: str, start=1, limit=5000, convert="USD", prefetch=0,
+    ):
+        """ Iterates over all market pairs of the specified exchange page by
+        page and yields one market pair at a time.
+
+        Parameters
+        ----------
+        slug : `str`
+            See slug.
+        start : `int`, optional
+            Start (1-based index) of the first market pair to return.
+        limit : `int`, optional
+            The number of market pairs of each page.
+        convert : `str` or `list` of `str`, optional
+            See slug.
+        prefetch : `int`, optional
+            The number of pages requested ahead of the current page.
+
+        Returns
+        -------
+        `Pages`
+            Iterable of `json obj`, use "async for" with the AsyncClient.
+            Schema - https://coinmarketcap.com/api/documentation/v1/#operation/getV1ExchangeMarketpairsLatest
+
+        Raises
+        ------
+        ValueError
+            If arguments are not parseable
+        requests.exceptions.HTTPError
+            If status code is not 200
+        """
+        return Pages(lambda x: self.slug(slug, x, limit, convert),
+                     start, limit, "market_pairs", prefetch)
+
 
 class Quotes:
     """ Returns an interval of latest and historic quotes for any exchange
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import inspect
+
+
+class Pages:
+    """ Walks every page of a paged endpoint lazily and yields the records
+    one by one, so only one page is held in memory at a time. The walk stops
+    when a page is shorter than "limit".
+
+    With "prefetch" pages, the next pages are requested ahead on worker
+    threads, or tasks on the AsyncClient, while the current page is consumed.
+    The requests still pass the client's throttler. Up to "prefetch" pages
+    past the end of the list are requested before the walk stops.
+
+    Iterate with "for" on the Client and with "async for" on the
+    AsyncClient.
+
+    Parameters
+    ----------
+    page : `callable`
+        Requests one page, receives the "start" (1-based index) of the page.
+    start : `int`, optional
+        Start (1-based index) of the first page.
+    limit : `int`, optional
+        The number of records of each page.
+    key : `str`, optional
+        The records are in data[key] instead of data, E.g "market_pairs".
+    prefetch : `int`, optional
+        The number of pages requested ahead of the current page.
+    """
+
+    def __init__(self, page, start=1, limit=5000, key=None, prefetch=0):
+        self.page = page
+        self.start = int(start)
+        self.limit = int(limit)
+        self.key = key
+        self.prefetch = int(prefetch)
+
+    def __iter__(self):
+        pool = ThreadPoolExecutor(self.prefetch + 1)
+        pending = deque()
+        start = self.start
+        try:
+            while True:
+                while len(pending) <= self.prefetch:
+                    pending.append(pool.submit(self._page, start))
+                    start += self.limit
+                records = self._records(pending.popleft().result())
+                yield from records
+                if len(records) < self.limit:
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    async def __aiter__(self):
+        pending = deque()
+        start = self.start
+        try:
+            while True:
+                while len(pending) <= self.prefetch:
+                    pending.append(asyncio.ensure_future(
+                        self._async_page(start)))
+                    start += self.limit
+                records = self._records(await pending.popleft())
+                for record in records:
+                    yield record
+                if len(records) < self.limit:
+                    return
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _page(self, start):
+        res = self.page(start)
+        if isinstance(res, Future):
+            res = res.result()
+        return res
+
+    async def _async_page(self, start):
+        res = self.page(start)
+        if inspect.isawaitable(res):
+            res = await res
+        return res
+
+    def _records(self, res):
+        data = res["data"]
+        if self.key is not None:
+            data = data[self.key]
+        return data
@@ -5,6 +5,13 @@ import datetime
 import sys
 
 
+LISTS = ("id", "symbol", "slug", "convert")
+NUMBERS = ("id", "start", "limit", "count")
+DEFAULTS = {"start": "1", "convert": "USD"}
+CHUNKS = ("id", "symbol", "slug")
+CHUNK_LENGTH = 2000
+
+
 def args(**kwarg) -> dict:
     params = {}
     for method_name, arg in kwarg.items():
@@ -20,10 +27,8 @@ def id(arg: Union[int, str, list]) -> int:
     if isinstance(arg, int) or isinstance(arg, str):
         return str(arg)
     elif isinstance(arg, list):
-        if all(isinstance(id, int) for id in arg):
+        if all(isinstance(id, (int, str)) for id in arg):
             return ",".join(map(str, arg))
-        if all(isinstance(id, str) for id in arg):
-            return ",".join(arg)
         else:
             raise ValueError
     else:
@@ -121,3 +126,52 @@ def market_type(arg: str) -> str:
 
 def amount(arg: Union[float, int, str]) -> str:
     return str(arg)
+
+
+def canonical(params: dict) -> dict:
+    """ Canonical form of request parameters, so equivalent requests share
+    the same url and cache key. Lists are sorted and deduplicated, numeric
+    strings are normalized and parameters with the API's default value are
+    dropped.
+    """
+    res = {}
+    for name in sorted(params):
+        value = str(params[name])
+        if name in LISTS:
+            values = {_number(v) if name in NUMBERS else v.strip()
+                      for v in value.split(",")}
+            key = int if name in NUMBERS and all(
+                v.isdigit() for v in values) else str
+            value = ",".join(sorted(values, key=key))
+        elif name in NUMBERS:
+            value = _number(value)
+        if DEFAULTS.get(name) != value:
+            res[name] = value
+    return res
+
+
+def _number(arg: str) -> str:
+    arg = arg.strip()
+    return str(int(arg)) if arg.isdigit() else arg
+
+
+def chunks(params: dict, length=CHUNK_LENGTH) -> list:
+    """ Split the parameters of a request with a long id, symbol or slug list
+    into parameters of several requests, each list at most "length"
+    characters long.
+    """
+    for name in CHUNKS:
+        value = params.get(name)
+        if value is None or len(str(value)) <= length:
+            continue
+
+        res, chunk, size = [], [], 0
+        for v in str(value).split(","):
+            if chunk and size + 1 + len(v) > length:
+                res.append(dict(params, **{name: ",".join(chunk)}))
+                chunk = []
+            size = size + 1 + len(v) if chunk else len(v)
+            chunk.append(v)
+        res.append(dict(params, **{name: ",".join(chunk)}))
+        return res
+    return [params]
@@ -4,63 +4,228 @@ from os.path import join
 from pathlib import Path
 from tempfile import gettempdir
 from requests_cache.core import CachedSession as session
-from threading import Lock
-from json import load
+from threading import Lock, local
+from collections import OrderedDict
+from hashlib import sha1
+from json import load, loads, dumps
 from os import environ
-from ratelimit import limits, sleep_and_retry
-from datetime import datetime
+from ratelimit import RateLimitException
+from datetime import datetime, timedelta
 from calendar import monthrange
+from math import ceil
+from time import monotonic, sleep, time
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import requests
+
+# local
+from .cache import MemoryCache, Subsets, Policy, Connections, NEVER
+from .backends import CompressedCache, ConcurrentCache
 
 FILE = ".coinmarketcap.json"
+SANDBOX = "https://sandbox-api.coinmarketcap.com/v1/"
+PRODUCTION = "https://pro-api.coinmarketcap.com/v1/"
+HEADER = "X-CMC_PRO_API_KEY"
+
+
+def keys(apikey):
+    return list(apikey) if isinstance(apikey, (list, tuple)) else [apikey]
+
+
+class CachedSession(session):
+    """ CachedSession where the expiration time can be passed to each
+    request with the keyword argument "expire".
+    """
+
+    def __init__(self, cf, expire, backend="sqlite"):
+        self._expire = local()
+        session.__init__(self, cf, cache_backend(backend, cf), expire)
+
+    @property
+    def _cache_expire_after(self):
+        return getattr(self._expire, "value", self._default_expire)
+
+    @_cache_expire_after.setter
+    def _cache_expire_after(self, value):
+        self._default_expire = value
+
+    def get(self, url, expire=None, **kwargs):
+        if expire is None:
+            return session.get(self, url, **kwargs)
+
+        if expire == NEVER:
+            self._expire.value = None
+        else:
+            self._expire.value = timedelta(seconds=expire)
+        try:
+            return session.get(self, url, **kwargs)
+        finally:
+            del self._expire.value
+
+    def lookup(self, url, expire):
+        """ Returns the cached response of a GET request to "url" if it was
+        stored less than "expire" seconds ago, otherwise `None`. Unlike
+        "cache.has_url", expired responses are missing, since getting them
+        sends a request.
+        """
+        request = self.prepare_request(requests.Request("GET", url))
+        try:
+            response, timestamp = self.cache.get_response_and_time(
+                self.cache.create_key(request))
+        except (ImportError, TypeError):
+            return None
+        if response is None:
+            return None
+        if expire != NEVER and (
+                datetime.utcnow() - timestamp > timedelta(seconds=expire)):
+            return None
+        response.from_cache = True
+        return response
+
+
+def cache_backend(backend, cf):
+    """ Returns the requests_cache backend for the "backend" argument of the
+    Client, "sqlite" keeps the pickled responses in "cf".sqlite,
+    "compressed" only their compressed bodies in "cf"_compressed.sqlite and
+    "concurrent" the compressed bodies in the shards in "cf"_concurrent.
+    """
+    if backend == "sqlite":
+        return backend
+    if backend == "compressed":
+        return CompressedCache(cf + "_compressed.sqlite")
+    if backend == "concurrent":
+        return ConcurrentCache(cf + "_concurrent")
+    raise ValueError("Argument backend must be either "
+                     "\"sqlite\", \"compressed\" or \"concurrent\"")
 
 
 class Session:
-    def __init__(self, apikey, expire, cf):
-        self._session = session(cf, "sqlite", expire)
-        self._session.headers.update({"X-CMC_PRO_API_KEY": apikey})
+    def __init__(self, apikey, expire, cf, memory=0, policy=False,
+                 backend="sqlite"):
+        self._apikeys = keys(apikey)
+        self._policy = Policy(expire, policy_rules(policy))
+        self._memory = MemoryCache(expire, memory)
+        self._subsets = Subsets(self._memory)
+        self._session = CachedSession(cf, expire, backend)
+        self._session.headers.update({HEADER: self._apikeys[0]})
         self._session.headers.update({"Accept": "application/json"})
         self._session.headers.update({"Accept-Encoding": "deflate, gzip"})
+        self._stream = None
+
+    def stream_session(self):
+        """ Session without cache for streamed responses, created lazily.
+        """
+        if self._stream is None:
+            self._stream = requests.Session()
+            self._stream.headers.update(self._session.headers)
+        return self._stream
 
     def clear_cache(self):
+        self._memory.clear()
         self._session.cache.clear()
 
+    def close(self):
+        """ Close the sessions, and the cache if its backend holds threads
+        or connections.
+        """
+        self._session.close()
+        if self._stream is not None:
+            self._stream.close()
+        if hasattr(self._session.cache, "close"):
+            self._session.cache.close()
 
-class Sandbox(Session):
-    def __init__(self, apikey, expire):
-        self._url = "https://sandbox-api.coinmarketcap.com/v1/"
-        cf = join(gettempdir(), "CoinMarketCap_sandbox")
-        if apikey is None:
+
+def policy_rules(policy):
+    """ Returns the Policy rules for the "policy" argument of the clients,
+    `False` gives every request the same expiration time and `True` the
+    default rules.
+    """
+    if policy is True:
+        return None
+    return policy or {}
+
+
+def key(apikey, environment):
+    """ Locate the API key for "environment" ("sandbox" or "production") if
+    none was passed, first in $HOME/.coinmarketcap.json and then in the
+    COINMARKETCAP_{SANDBOX or PRODUCTION} environment variable.
+    """
+    if apikey is None:
+        try:
+            with open(join(Path.home(), FILE), "r") as fp:
+                keys = load(fp)
+            apikey = keys[environment]
+
+        except FileNotFoundError:
             try:
-                with open(join(Path.home(), FILE), "r") as fp:
-                    keys = load(fp)
-                apikey = keys["sandbox"]
+                apikey = environ["COINMARKETCAP_" + environment.upper()]
+            except KeyError:
+                raise KeyError("Can not locate key.")
+    return apikey
 
-            except FileNotFoundError:
-                try:
-                    apikey = environ["COINMARKETCAP_SANDBOX"]
-                except KeyError:
-                    raise KeyError("Can not locate key.")
 
-        Session.__init__(self, apikey, expire, cf)
+class Sandbox(Session):
+    def __init__(self, apikey, expire, memory=0, policy=False,
+                 backend="sqlite"):
+        self._url = SANDBOX
+        cf = join(gettempdir(), "CoinMarketCap_sandbox")
+        Session.__init__(self, key(apikey, "sandbox"), expire, cf, memory,
+                         policy, backend)
 
 
 class Production(Session):
-    def __init__(self, apikey, expire):
-        self._url = "https://pro-api.coinmarketcap.com/v1/"
+    def __init__(self, apikey, expire, memory=0, policy=False,
+                 backend="sqlite"):
+        self._url = PRODUCTION
         cf = join(gettempdir(), "CoinMarketCap_production")
-        if apikey is None:
-            try:
-                with open(join(Path.home(), FILE), "r") as fp:
-                    keys = load(fp)
-                apikey = keys["production"]
+        Session.__init__(self, key(apikey, "production"), expire, cf, memory,
+                         policy, backend)
+
+
+class AsyncSession:
+    def __init__(self, apikey, expire, memory=1024, policy=False):
+        self._apikeys = keys(apikey)
+        self._policy = Policy(expire, policy_rules(policy))
+        self._cache = MemoryCache(expire, memory)
+        self._subsets = Subsets(self._cache)
+        self._session = None
+        self._headers = {
+            HEADER: self._apikeys[0],
+            "Accept": "application/json",
+            "Accept-Encoding": "deflate, gzip",
+        }
 
-            except FileNotFoundError:
-                try:
-                    apikey = environ["COINMARKETCAP_PRODUCTION"]
-                except KeyError:
-                    raise KeyError("Can not locate key.")
+    async def session(self):
+        """ The aiohttp session is created lazily since it must be bound to
+        the running event loop.
+        """
+        if self._session is None or self._session.closed:
+            from aiohttp import ClientSession
 
-        Session.__init__(self, apikey, expire, cf)
+            self._session = ClientSession(headers=self._headers)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+class AsyncSandbox(AsyncSession):
+    def __init__(self, apikey, expire, memory=1024, policy=False):
+        self._url = SANDBOX
+        AsyncSession.__init__(
+            self, key(apikey, "sandbox"), expire, memory, policy)
+
+
+class AsyncProduction(AsyncSession):
+    def __init__(self, apikey, expire, memory=1024, policy=False):
+        self._url = PRODUCTION
+        AsyncSession.__init__(
+            self, key(apikey, "production"), expire, memory, policy)
 
 
 class Plan:
@@ -108,32 +273,441 @@ class Plan:
         return calls, period
 
 
+def credits(url):
+    """ Estimate the call credits CoinMarketCap bills for a request.
+
+    One credit per 100 data points (rows, ids, symbols, slugs or historical
+    points) rounded up, plus one credit per "convert" option beyond the
+    first. The map endpoints are billed one credit per request.
+
+    Parameters
+    ----------
+    url : `str`
+        The prepared url of the request.
+
+    Returns
+    -------
+    `int`
+    """
+    url = urlsplit(url)
+    params = parse_qs(url.query)
+
+    points = 1
+    for name in ("id", "symbol", "slug"):
+        if name in params:
+            points = len(params[name][0].split(","))
+    if "limit" in params:
+        points = int(params["limit"][0])
+    if "count" in params and url.path.endswith("historical"):
+        points = int(params["count"][0])
+    if url.path.endswith("map"):
+        points = 1
+
+    cost = max(1, ceil(points / 100))
+    if "convert" in params:
+        cost += len(params["convert"][0].split(",")) - 1
+    return cost
+
+
+class Bucket:
+    """ Token bucket holding up to "capacity" tokens, refilled continuously
+    over "period" seconds. A capacity of 0 means unlimited.
+    """
+
+    def __init__(self, capacity, period, now):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.stamp = now
+
+    def refill(self, now):
+        elapsed = now - self.stamp
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.stamp = now
+
+    def budget(self):
+        return self.tokens if self.capacity else float("inf")
+
+    def wait(self, tokens):
+        """ Seconds until "tokens" are available. """
+        if not self.capacity:
+            return 0
+        missing = min(tokens, self.capacity) - self.tokens
+        return max(0, missing / self.rate)
+
+    def take(self, tokens):
+        if self.capacity:
+            self.tokens = min(self.capacity, self.tokens - tokens)
+
+
+class GCRA:
+    """ Generic cell rate algorithm, virtual scheduling on a monotonic clock.
+    Allows bursts of "calls" requests and on average "calls" requests every
+    "period" seconds.
+
+    Each call atomically claims the next theoretical arrival time and
+    returns how long to wait for it, so callers sleep outside the lock and
+    are served in the order they arrived.
+    """
+
+    def __init__(self, calls, period, clock=monotonic):
+        self.interval = period / calls if calls else 0
+        self.tolerance = period - self.interval
+        self.clock = clock
+        self.tat = clock()
+        self.lock = Lock()
+
+    def dump(self):
+        return [self.tat]
+
+    def load(self, state):
+        self.tat, = state
+
+    def reserve(self, cost=1, block=True):
+        """ Claim a send time.
+
+        Returns
+        -------
+        `float`
+            Seconds to wait before the request can be sent.
+
+        Raises
+        ------
+        ratelimit.RateLimitException
+            If "block" is `False` and the request would have to wait.
+        """
+        with self.lock:
+            now = self.clock()
+            tat = max(self.tat, now)
+            wait = tat - self.tolerance - now
+            if wait > 0 and not block:
+                raise RateLimitException("too many calls", wait)
+            self.tat = tat + self.interval
+            return max(0, wait)
+
+    def budget(self):
+        """ The number of calls that can be sent right away. """
+        if not self.interval:
+            return float("inf")
+        with self.lock:
+            slack = self.clock() + self.tolerance - self.tat
+            return max(0, slack / self.interval + 1)
+
+
+class Credits:
+    """ Credit aware limiter with one token bucket for each level of the
+    plan. The minute bucket counts requests since CoinMarketCap's rate limit
+    is per request, while the daily and monthly buckets count call credits.
+
+    Credits are reserved up front, the buckets may go into debt and later
+    callers wait for the debt of earlier callers to be paid off.
+
+    Parameters
+    ----------
+    plan : `tuple` of `int`
+        The (minute, daily, monthly) limits of the plan.
+    """
+
+    def __init__(self, plan, clock=monotonic):
+        now = datetime.now()
+        days = monthrange(now.year, now.month)[1]
+
+        self.lock = Lock()
+        self.clock = clock
+        self.minute = Bucket(plan[0], 60, clock())
+        self.daily = Bucket(plan[1], 86400, clock())
+        self.monthly = Bucket(plan[2], days * 86400, clock())
+
+    @property
+    def buckets(self):
+        return (self.minute, self.daily, self.monthly)
+
+    def dump(self):
+        return [value for b in self.buckets for value in (b.tokens, b.stamp)]
+
+    def load(self, state):
+        for i, bucket in enumerate(self.buckets):
+            bucket.tokens, bucket.stamp = state[2 * i:2 * i + 2]
+
+    def reserve(self, cost=1, block=True):
+        """ Charge "cost" credits.
+
+        Returns
+        -------
+        `float`
+            Seconds to wait before the request can be sent.
+
+        Raises
+        ------
+        ratelimit.RateLimitException
+            If "block" is `False` and the credits are not available.
+        """
+        with self.lock:
+            now = self.clock()
+            for bucket in self.buckets:
+                bucket.refill(now)
+
+            wait = max(
+                self.minute.wait(1),
+                self.daily.wait(cost),
+                self.monthly.wait(cost),
+            )
+            if wait and not block:
+                raise RateLimitException("too many credits", wait)
+            self.minute.take(1)
+            self.daily.take(cost)
+            self.monthly.take(cost)
+            return wait
+
+    def budget(self):
+        """ The number of credits that can be spent right away. """
+        with self.lock:
+            now = self.clock()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            if self.minute.budget() < 1:
+                return 0
+            return max(0, min(self.daily.budget(), self.monthly.budget()))
+
+    def reconcile(self, cost, res):
+        """ Correct an estimated "cost" with the credits CoinMarketCap
+        reports in "status.credit_count" of the response "res".
+        """
+        credit_count = res.get("status", {}).get("credit_count")
+        if credit_count is None or credit_count == cost:
+            return
+        with self.lock:
+            self.daily.take(credit_count - cost)
+            self.monthly.take(credit_count - cost)
+
+
+class Store:
+    """ Limiter state shared by every process on the host, kept in a sqlite
+    database in WAL mode.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the sqlite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = Connections(path, isolation_level=None)
+        with self.connection() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "create table if not exists `limiter` "
+                "(name PRIMARY KEY, state)")
+
+    def lock(self, name, limiter):
+        return StoreLock(self, name, limiter)
+
+
+def store(shared):
+    """ Returns the Store for the "shared" argument of the clients. """
+    if not shared:
+        return None
+    if shared is True:
+        shared = join(gettempdir(), "CoinMarketCap_throttle.sqlite")
+    return Store(shared)
+
+
+def local_path(path, sandbox, name):
+    """ Returns the path of a local file for arguments of the Client which
+    are either `True` for a file in the temp dir or a path.
+    """
+    if path is True:
+        env = "sandbox" if sandbox else "production"
+        path = join(gettempdir(), "CoinMarketCap_%s_%s" % (env, name))
+    return path
+
+
+class StoreLock:
+    """ Lock replacing a limiter's thread lock. While it is held, the
+    limiter holds the state stored under "name" and every other thread and
+    process is locked out by an immediate sqlite transaction.
+    """
+
+    def __init__(self, store, name, limiter):
+        self.store = store
+        self.name = name
+        self.limiter = limiter
+        self.lock = Lock()
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            con = self.store.connection()
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute(
+                "select state from `limiter` where name=?", (self.name,)
+            ).fetchone()
+        except Exception:
+            self.lock.release()
+            raise
+        if row is not None:
+            self.limiter.load(loads(row[0]))
+
+    def __exit__(self, exc_type, *exc):
+        con = self.store.connection()
+        try:
+            if exc_type is None:
+                con.execute(
+                    "insert or replace into `limiter` (name, state) "
+                    "values (?, ?)", (self.name, dumps(self.limiter.dump()))
+                )
+                con.execute("COMMIT")
+            else:
+                con.execute("ROLLBACK")
+        finally:
+            self.lock.release()
+
+
 class Throttler(Plan):
-    def __init__(self, plan, throttle, block):
+    """ Throttles requests according to the plan.
+
+    Parameters
+    ----------
+    plan : `str`
+        See Plan.
+    throttle : `str`
+        Valid values: {None, "minute", "daily", "monthly", "credits"}.
+    block : `bool`
+        block if the request limit is exceeded, otherwise raise
+        ratelimit.RateLimitException.
+    store : `Store`, optional
+        Share the throttling state with every process on the host.
+    name : `str`, optional
+        Name of the state in the store, throttlers with the same name share
+        the same budget.
+    """
+
+    def __init__(self, plan, throttle, block, store=None, name=""):
         Plan.__init__(self, plan)
 
-        self.lock = Lock()
-        scheme = (0, 0)
+        clock = monotonic if store is None else time
         self.throttling = True
+        self.credits = None
+        self.limiter = None
         if throttle is None:
             self.throttling = False
         elif throttle == "minute":
-            scheme = self.minute
+            self.limiter = GCRA(*self.minute, clock=clock)
         elif throttle == "daily":
-            scheme = self.daily
+            self.limiter = GCRA(*self.daily, clock=clock)
         elif throttle == "monthly":
-            scheme = self.monthly
+            self.limiter = GCRA(*self.monthly, clock=clock)
+        elif throttle == "credits":
+            self.credits = self.limiter = Credits(self.plan, clock=clock)
         else:
             raise ValueError("Argument throttle must be either ")
 
-        self.limit = limits(*scheme, raise_on_limit=block)(lambda: None)
-        self.sleep = sleep_and_retry(self.limit)
+        if self.throttling and store is not None:
+            name = "%s:%s:%s" % (name, throttle, plan)
+            self.limiter.lock = store.lock(name, self.limiter)
         self.block = block
 
-    def throttle(self):
+    def reserve(self, cost=1):
+        """ Reserve a send time for a request costing "cost" credits.
+
+        Returns
+        -------
+        `float`
+            Seconds to wait before the request can be sent.
+        """
         if self.throttling:
-            with self.lock:
-                if self.block:
-                    self.sleep()
-                else:
-                    self.limit()
+            return self.limiter.reserve(cost, self.block)
+        return 0
+
+    def budget(self):
+        if self.throttling:
+            return self.limiter.budget()
+        return float("inf")
+
+    def throttle(self, cost=1):
+        wait = self.reserve(cost)
+        if wait:
+            sleep(wait)
+
+    def reconcile(self, cost, res):
+        if self.credits is not None:
+            self.credits.reconcile(cost, res)
+
+
+class KeyPool:
+    """ Pool of API keys where each key has its own plan and throttler.
+    Every request is dispatched to the key with the most remaining budget,
+    ties are resolved round-robin.
+
+    Parameters
+    ----------
+    apikeys : `list` of `str`
+        The API keys.
+    plans : `str` or `list` of `str`
+        One plan for all keys, or one plan for each key.
+    throttle : `str`
+        See Throttler.
+    block : `bool`
+        See Throttler.
+    store : `Store`, optional
+        See Throttler, the keys are stored as hashes.
+
+    Raises
+    ------
+    ValueError
+        If the number of plans does not match the number of keys.
+    """
+
+    def __init__(self, apikeys, plans, throttle, block, store=None):
+        if isinstance(plans, str):
+            plans = [plans] * len(apikeys)
+        if len(plans) != len(apikeys):
+            raise ValueError("Pass one plan for each API key.")
+
+        self.lock = Lock()
+        self.throttlers = OrderedDict(
+            (apikey, Throttler(plan, throttle, block, store,
+                               sha1(apikey.encode()).hexdigest()))
+            for apikey, plan in zip(apikeys, plans)
+        )
+
+    @property
+    def plan(self):
+        return next(iter(self.throttlers.values())).plan
+
+    def reserve(self, cost=1):
+        """ Pick a key and reserve a send time for it.
+
+        Returns
+        -------
+        `tuple` of `str` and `float`
+            The key and the seconds to wait before the request can be sent.
+        """
+        with self.lock:
+            apikey = max(
+                self.throttlers, key=lambda k: self.throttlers[k].budget())
+            self.throttlers.move_to_end(apikey)
+            return apikey, self.throttlers[apikey].reserve(cost)
+
+    def throttle(self, cost=1):
+        apikey, wait = self.reserve(cost)
+        if wait:
+            sleep(wait)
+        return apikey
+
+    def reconcile(self, apikey, cost, res):
+        if apikey in self.throttlers:
+            self.throttlers[apikey].reconcile(cost, res)
+
+
+class AsyncKeyPool(KeyPool):
+    """ Event loop aware key pool, waiting for a free slot suspends the
+    calling coroutine instead of sleeping the thread.
+    """
+
+    async def throttle(self, cost=1):
+        apikey, wait = self.reserve(cost)
+        if wait:
+            await asyncio.sleep(wait)
+        return apikey
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta, timezone
+from json import dumps
+from math import ceil
+import re
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# local
+from . import arrays
+from .cache import Connections
+
+COUNT = 10000
+STEPS = {
+    "hourly": 3600,
+    "daily": 86400,
+    "weekly": 7 * 86400,
+    "monthly": 28 * 86400,
+    "yearly": 365 * 86400,
+}
+UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+def timestamp(arg) -> datetime:
+    """ Timezone aware datetime of a datetime, Unix or ISO 8601 timestamp,
+    naive timestamps are in UTC.
+    """
+    if isinstance(arg, (int, float)):
+        return datetime.fromtimestamp(arg, timezone.utc)
+    if not isinstance(arg, datetime):
+        arg = datetime.fromisoformat(str(arg).replace("Z", "+00:00"))
+    if arg.tzinfo is None:
+        return arg.replace(tzinfo=timezone.utc)
+    return arg
+
+
+def step(interval: str) -> int:
+    """ The shortest number of seconds between two bars of an interval,
+    E.g "hourly", "daily" or "4h".
+    """
+    if interval in STEPS:
+        return STEPS[interval]
+    match = re.fullmatch(r"(\d+)([mhd])", interval)
+    if match is None:
+        raise ValueError("Unknown interval: %s" % interval)
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+
+def windows(time_start, time_end, time_period, interval, count=COUNT):
+    """ Split the span from "time_start" (exclusive) to "time_end" (inclusive)
+    into consecutive windows of at most "count" bars.
+
+    Returns
+    -------
+    `list` of `tuple`
+        (time_start, time_end, count) of each window, where count is the
+        most bars the window can hold. Requests are billed by their count,
+        so a short window is sent with a small count.
+    """
+    time_start, time_end = timestamp(time_start), timestamp(time_end)
+    seconds = max(step(time_period), step(interval))
+    size = timedelta(seconds=count * seconds)
+    res = []
+    while time_start < time_end:
+        end = min(time_start + size, time_end)
+        bars = ceil((end - time_start).total_seconds() / seconds) + 1
+        res.append((time_start, end, min(bars, count)))
+        time_start += size
+    return res
+
+
+def series(results: list, key="quotes") -> dict:
+    """ Join the responses of consecutive windows of one asset into one
+    series ordered by "time_open" without duplicate bars.
+    """
+    bars = {}
+    for res in results:
+        for bar in res["data"][key]:
+            bars.setdefault(bar.get("time_open", bar.get("timestamp")), bar)
+    data = dict(results[0]["data"]) if results else {}
+    data[key] = [bars[time] for time in sorted(bars)]
+    return data
+
+
+class History:
+    """ Local store of historical series that remembers which time ranges of
+    each series it holds, so a query only requests the missing ranges from
+    the API. Series are kept by endpoint, id, time period, interval and
+    convert currency in a sqlite database in WAL mode.
+
+    Ranges that reach into the last "interval" before the current time are
+    requested again on the next query, since their last bar may still change.
+
+    Parameters
+    ----------
+    client : `Client`
+        The client that requests the missing ranges.
+    path : `str`
+        Path to the sqlite database.
+    workers : `int`, optional
+        The maximum number of concurrent requests.
+    """
+
+    def __init__(self, client, path, workers=None):
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.connection = Connections(path)
+        with self.connection() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "create table if not exists `ranges` "
+                "(series, time_start, time_end)")
+            con.execute(
+                "create table if not exists `bars` "
+                "(series, time, bar, PRIMARY KEY (series, time))")
+
+    def ohlcv(
+        self,
+        id,
+        time_start,
+        time_end=None,
+        time_period="daily",
+        interval="daily",
+        convert="USD",
+        array=False,
+    ):
+        """ Returns the OHLCV bars of a cryptocurrency between "time_start"
+        (exclusive) and "time_end" (inclusive), see
+        cryptocurrency.ohlcv.historical_id.
+
+        Set "array" to return a NumPy structured array, see
+        coinmarketcap.arrays.ohlcv.
+
+        Returns
+        -------
+        `list` of `json obj` or `numpy.ndarray`
+            The bars ordered by "time_open".
+        """
+        bars = self._query(
+            "cryptocurrency/ohlcv/historical", id, time_start, time_end,
+            time_period, interval, convert,
+            lambda c, s, e, n: c.cryptocurrency.ohlcv.historical_id(
+                id, s, e, time_period, n, interval, convert))
+        return arrays.ohlcv(bars, convert) if array else bars
+
+    def quotes(self, id, time_start, time_end=None, interval="5m",
+               convert="USD", array=False):
+        """ Returns the quotes of a cryptocurrency between "time_start"
+        (exclusive) and "time_end" (inclusive), see
+        cryptocurrency.quotes.historical_id.
+
+        Set "array" to return a NumPy structured array, see
+        coinmarketcap.arrays.quotes.
+
+        Returns
+        -------
+        `list` of `json obj` or `numpy.ndarray`
+            The quotes ordered by "timestamp".
+        """
+        bars = self._query(
+            "cryptocurrency/quotes/historical", id, time_start, time_end,
+            interval, interval, convert,
+            lambda c, s, e, n: c.cryptocurrency.quotes.historical_id(
+                id, s, e, n, interval, convert))
+        return arrays.quotes(bars, convert) if array else bars
+
+    def exchange_quotes(self, id, time_start, time_end=None, interval="5m",
+                        convert="USD", array=False):
+        """ Returns the quotes of an exchange between "time_start"
+        (exclusive) and "time_end" (inclusive), see
+        exchange.quotes.historical_id.
+
+        Set "array" to return a NumPy structured array, see
+        coinmarketcap.arrays.quotes.
+
+        Returns
+        -------
+        `list` of `json obj` or `numpy.ndarray`
+            The quotes ordered by "timestamp".
+        """
+        bars = self._query(
+            "exchange/quotes/historical", id, time_start, time_end,
+            interval, interval, convert,
+            lambda c, s, e, n: c.exchange.quotes.historical_id(
+                id, s, e, n, interval, convert))
+        return arrays.quotes(bars, convert) if array else bars
+
+    def global_metrics(self, time_start, time_end=None, interval="1d",
+                       convert="USD", array=False):
+        """ Returns the global market metrics between "time_start"
+        (exclusive) and "time_end" (inclusive), see
+        global_metrics.quotes.historical.
+
+        Set "array" to return a NumPy structured array, see
+        coinmarketcap.arrays.quotes.
+
+        Returns
+        -------
+        `list` of `json obj` or `numpy.ndarray`
+            The quotes ordered by "timestamp".
+        """
+        bars = self._query(
+            "global-metrics/quotes/historical", "", time_start, time_end,
+            interval, interval, convert,
+            lambda c, s, e, n: c.global_metrics.quotes.historical(
+                s, e, n, interval, convert))
+        return arrays.quotes(bars, convert) if array else bars
+
+    def clear(self):
+        """ Remove every stored series. """
+        with self.connection() as con:
+            con.execute("delete from `ranges`")
+            con.execute("delete from `bars`")
+
+    def _query(self, endpoint, id, time_start, time_end, time_period,
+               interval, convert, request):
+        series = "%s?id=%s&time_period=%s&interval=%s&convert=%s" % (
+            endpoint, id, time_period, interval, convert)
+        now = datetime.now(timezone.utc)
+        start = timestamp(time_start)
+        end = now if time_end is None else timestamp(time_end)
+        horizon = min(end, now - timedelta(seconds=step(interval)))
+
+        calls = [
+            lambda c, s=s, e=e, n=n: request(c, s, e, n)
+            for gap in self._gaps(series, start.timestamp(), end.timestamp())
+            for s, e, n in windows(timestamp(gap[0]), timestamp(gap[1]),
+                                time_period, interval)
+        ]
+        recent = {}
+        if calls:
+            results = self.client.gather(calls, self.workers)
+            recent = self._add(series, results, start, horizon)
+
+        with self.connection() as con:
+            rows = con.execute(
+                "select time, bar from `bars` where series=? and time>? "
+                "and time<=? order by time",
+                (series, start.timestamp(), end.timestamp())).fetchall()
+        bars = dict((time, loads(bar)) for time, bar in rows)
+        bars.update((time, bar) for time, bar in recent.items()
+                    if start.timestamp() < time <= end.timestamp())
+        return [bars[time] for time in sorted(bars)]
+
+    def _gaps(self, series, start, end):
+        with self.connection() as con:
+            ranges = con.execute(
+                "select time_start, time_end from `ranges` where series=? "
+                "order by time_start", (series,)).fetchall()
+        gaps, cursor = [], start
+        for time_start, time_end in ranges:
+            if time_start >= end:
+                break
+            if time_start > cursor:
+                gaps.append((cursor, time_start))
+            cursor = max(cursor, time_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def _add(self, series, results, start, horizon):
+        """ Store the bars and the ranges up to "horizon", returns the bars
+        after "horizon" by time.
+        """
+        bars, recent = [], {}
+        for res in results:
+            for bar in res["data"]["quotes"]:
+                time = timestamp(bar.get("time_open", bar.get("timestamp")))
+                if time <= horizon:
+                    bars.append((series, time.timestamp(), dumps(bar)))
+                else:
+                    recent[time.timestamp()] = bar
+
+        with self.connection() as con:
+            con.executemany(
+                "insert or replace into `bars` (series, time, bar) "
+                "values (?, ?, ?)", bars)
+            if start < horizon:
+                rows = con.execute(
+                    "select time_start, time_end from `ranges` "
+                    "where series=?", (series,)).fetchall()
+                rows.append((start.timestamp(), horizon.timestamp()))
+                con.execute("delete from `ranges` where series=?", (series,))
+                con.executemany(
+                    "insert into `ranges` (series, time_start, time_end) "
+                    "values (?, ?, ?)",
+                    [(series,) + row for row in _union(rows)])
+        return recent
+
+
+def _union(ranges):
+    res = []
+    for time_start, time_end in sorted(ranges):
+        if res and time_start <= res[-1][1]:
+            res[-1] = (res[-1][0], max(res[-1][1], time_end))
+        else:
+            res.append((time_start, time_end))
+    return res
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from sys import intern
+
+
+class Record:
+    """ Compact record with the fields of a JSON object as attributes. Only
+    the fields in "__slots__" are kept, missing fields are `None`. Symbols
+    and currency keys are interned, so every record shares the same strings.
+    """
+
+    __slots__ = ()
+    interned = ()
+    nested = {}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_json(cls, obj: dict):
+        """ Returns the record of a JSON object. """
+        self = cls.__new__(cls)
+        get = obj.get
+        for name in cls.__slots__:
+            value = get(name)
+            if value is not None:
+                if name in cls.interned:
+                    value = intern(value)
+                elif name in cls.nested:
+                    record = cls.nested[name]
+                    value = {intern(currency): record.from_json(quote)
+                             for currency, quote in value.items()}
+            setattr(self, name, value)
+        return self
+
+    def to_json(self) -> dict:
+        """ Returns the record as a JSON object. """
+        res = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if name in self.nested and value is not None:
+                value = {currency: quote.to_json()
+                         for currency, quote in value.items()}
+            res[name] = value
+        return res
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % (name, getattr(self, name))
+            for name in self.__slots__[:3]))
+
+
+class Quote(Record):
+    """ Market quote in one currency of a cryptocurrency or market pair. """
+
+    __slots__ = (
+        "price",
+        "volume_24h",
+        "volume_24h_base",
+        "volume_24h_quote",
+        "percent_change_1h",
+        "percent_change_24h",
+        "percent_change_7d",
+        "market_cap",
+        "last_updated",
+    )
+
+
+class Ohlcv(Record):
+    """ OHLCV quote in one currency of a bar. """
+
+    __slots__ = (
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "market_cap",
+        "timestamp",
+    )
+
+
+class Listing(Record):
+    """ Row of cryptocurrency listings or quotes, "quote" holds a `Quote`
+    by currency.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "symbol",
+        "slug",
+        "cmc_rank",
+        "num_market_pairs",
+        "circulating_supply",
+        "total_supply",
+        "max_supply",
+        "date_added",
+        "last_updated",
+        "tags",
+        "platform",
+        "quote",
+    )
+    interned = ("symbol", "slug")
+    nested = {"quote": Quote}
+
+
+class OhlcvBar(Record):
+    """ Bar of OHLCV history, "quote" holds an `Ohlcv` by currency. """
+
+    __slots__ = (
+        "time_open",
+        "time_close",
+        "time_high",
+        "time_low",
+        "quote",
+    )
+    nested = {"quote": Ohlcv}
+
+
+class MarketPair(Record):
+    """ Market pair of an exchange or cryptocurrency, "quote" holds a
+    `Quote` by currency.
+    """
+
+    __slots__ = (
+        "market_pair",
+        "market_pair_base",
+        "market_pair_quote",
+        "exchange",
+        "quote",
+    )
+    interned = ("market_pair",)
+    nested = {"quote": Quote}
+
+
+def records(res: dict, record) -> list:
+    """ Returns the records of a response, from a list or a dict by id in
+    "data", or from "data.quotes" or "data.market_pairs".
+
+    Parameters
+    ----------
+    res : `json obj`
+        The response of an endpoint.
+    record : `type`
+        The record type, E.g `Listing`.
+
+    Returns
+    -------
+    `list` of `Record`
+    """
+    data = res["data"]
+    if isinstance(data, dict):
+        for key in ("market_pairs", "quotes"):
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+        else:
+            data = data.values()
+    return [record.from_json(obj) for obj in data]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+from json import dumps, loads
+from requests.exceptions import HTTPError
+from threading import Lock, get_ident
+from time import time
+import gzip
+import os
+
+# endpoints which accept ids instead of symbols or slugs, by name
+ENDPOINTS = {
+    "cryptocurrency/info": "symbol",
+    "cryptocurrency/quotes/latest": "symbol",
+    "cryptocurrency/quotes/historical": "symbol",
+    "cryptocurrency/ohlcv/latest": "symbol",
+    "cryptocurrency/ohlcv/historical": "symbol",
+    "cryptocurrency/market-pairs/latest": "symbol",
+    "exchange/info": "slug",
+    "exchange/quotes/latest": "slug",
+    "exchange/quotes/historical": "slug",
+    "exchange/market-pairs/latest": "slug",
+}
+# endpoints with "data" by id
+KEYED = (
+    "cryptocurrency/info",
+    "cryptocurrency/quotes/latest",
+    "cryptocurrency/ohlcv/latest",
+    "exchange/info",
+    "exchange/quotes/latest",
+)
+
+
+class Resolver:
+    """ Local index of cryptocurrency symbols and exchange slugs to ids, so
+    requests by symbol or slug are sent by id instead. They share the cache
+    of the requests by id and the responses are keyed by the symbols or
+    slugs as requested.
+
+    The index is built from cryptocurrency/map and exchange/map, kept in a
+    gzipped JSON file and rebuilt after "expire" seconds. Symbols and slugs
+    missing from the index are looked up with one map request and added.
+    If a symbol matches several cryptocurrencies, the one with the best rank
+    is used. The maps are requested outside of the lock, the requests by
+    symbol or slug are sent as they are while the maps can't be requested
+    and for "retry" seconds after a failure.
+
+    Parameters
+    ----------
+    client : `Client`
+        The client that requests the maps.
+    path : `str`
+        Path to the index file.
+    expire : `int`, optional
+        Seconds until the index is rebuilt.
+    retry : `int`, optional
+        Seconds until a failed build is retried.
+    """
+
+    def __init__(self, client, path, expire=86400, retry=300):
+        self.client = client
+        self.path = path
+        self.expire = expire
+        self.retry = retry
+        self.lock = Lock()
+        self.updated = 0
+        self.failed = 0
+        self._building = False
+        self.symbols = {}
+        self.slugs = {}
+        self._load()
+
+    def resolve(self, urn: str, params: dict):
+        """ Returns the parameters of the request by id and the requested
+        names by id, or `None` if the request can't be sent by id.
+        """
+        name = ENDPOINTS.get(urn)
+        if name is None or name not in params or "id" in params:
+            return None
+        names = [n.strip() for n in str(params[name]).split(",")]
+        ids = self.ids(name, names)
+        if ids is None:
+            return None
+
+        params = dict(params)
+        del params[name]
+        params["id"] = ",".join(map(str, ids))
+        return params, dict(zip(map(str, ids), names))
+
+    def ids(self, name: str, names: list):
+        """ Returns the ids of cryptocurrency symbols or exchange slugs, or
+        `None` if one of them is unknown or the index can't be built.
+        """
+        with self.lock:
+            backoff = time() - self.failed < self.retry
+            build = (not backoff and not self._building
+                     and time() - self.updated > self.expire)
+            self._building = self._building or build
+        if build and not self._build():
+            return None
+
+        index = self.symbols if name == "symbol" else self.slugs
+        missing = [n for n in names if self._key(name, n) not in index]
+        if missing:
+            if backoff:
+                return None
+            self._add(name, missing)
+            index = self.symbols if name == "symbol" else self.slugs
+        ids = [index.get(self._key(name, n)) for n in names]
+        return None if None in ids else ids
+
+    @staticmethod
+    def rekey(urn: str, res: dict, names: dict) -> dict:
+        """ Key the "data" of a response by id with the requested names. """
+        if urn not in KEYED:
+            return res
+        data = {names[id]: value for id, value in res["data"].items()
+                if id in names}
+        return dict(res, data=data)
+
+    @staticmethod
+    def _key(name, value):
+        return value.upper() if name == "symbol" else value.lower()
+
+    def _build(self):
+        """ Swaps in an index built from the maps, returns `False` and
+        backs off if they can't be requested.
+        """
+        symbols, ranks = {}, {}
+        try:
+            for coin in self.client.cryptocurrency.map.iter_active():
+                self._symbol(symbols, ranks, coin)
+            slugs = {exchange["slug"].lower(): exchange["id"]
+                     for exchange in self.client.exchange.map.iter_active()}
+        except HTTPError:
+            with self.lock:
+                self.failed = time()
+                self._building = False
+            return False
+        with self.lock:
+            self.symbols, self.slugs, self._ranks = symbols, slugs, ranks
+            self.updated = time()
+            self._building = False
+            index = self._index()
+        self._dump(index)
+        return True
+
+    def _add(self, name, missing):
+        try:
+            if name == "symbol":
+                res = self.client.cryptocurrency.map.active_symbols(missing)
+            else:
+                res = self.client.exchange.map.active_slugs(missing)
+        except HTTPError:
+            # unknown names are left to the API to report
+            return
+        with self.lock:
+            # copies, readers of the previous index aren't locked
+            if name == "symbol":
+                symbols, ranks = dict(self.symbols), dict(self._ranks)
+                for coin in res["data"]:
+                    self._symbol(symbols, ranks, coin)
+                self.symbols, self._ranks = symbols, ranks
+            else:
+                self.slugs = dict(self.slugs, **{
+                    exchange["slug"].lower(): exchange["id"]
+                    for exchange in res["data"]})
+            index = self._index()
+        self._dump(index)
+
+    @staticmethod
+    def _symbol(symbols, ranks, coin):
+        key = coin["symbol"].upper()
+        rank = coin.get("rank") or float("inf")
+        if key not in symbols or rank < ranks[key]:
+            symbols[key] = coin["id"]
+            ranks[key] = rank
+
+    def _load(self):
+        self._ranks = {}
+        try:
+            with gzip.open(self.path, "rb") as f:
+                index = loads(f.read())
+        except (OSError, ValueError):
+            return
+        self.updated = index["updated"]
+        for symbol, id, rank in index["symbols"]:
+            self.symbols[symbol] = id
+            self._ranks[symbol] = float("inf") if rank is None else rank
+        self.slugs = dict(index["slugs"])
+
+    def _index(self):
+        return {
+            "updated": self.updated,
+            "symbols": [
+                [symbol, id, None if self._ranks[symbol] == float("inf")
+                 else self._ranks[symbol]]
+                for symbol, id in self.symbols.items()],
+            "slugs": list(self.slugs.items()),
+        }
+
+    def _dump(self, index):
+        tmp = "%s.%d.%d.tmp" % (self.path, os.getpid(), get_ident())
+        with gzip.open(tmp, "wb") as f:
+            f.write(dumps(index, separators=(",", ":")).encode())
+        os.replace(tmp, self.path)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+from codecs import getincrementaldecoder
+from json import JSONDecoder, JSONDecodeError
+import re
+
+# local
+from .endpoints import Cryptocurrency, Exchange, GlobalMetrics, Tools
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DELIMITERS = " \t\n\r,:]}"
+INCOMPLETE = object()
+OBJECT, KEY, COLON, VALUE, ARRAY, ITEM, DONE = range(7)
+
+
+def path(urn: str) -> tuple:
+    """ The path to the array of records in the response of "urn". """
+    if urn.endswith("market-pairs/latest"):
+        return ("data", "market_pairs")
+    return ("data",)
+
+
+class Items:
+    """ Incremental JSON parser which returns the items of the array at
+    "path" as soon as each item has been fed, E.g the rows of "data". Only
+    the unparsed rest of the document is buffered, so the memory is bounded
+    by the size of one item and one chunk.
+
+    The other values of the objects along the path are kept in "values" by
+    key, E.g values["status"]. Values of outer objects after the end of an
+    inner object on the path are not parsed.
+
+    Parameters
+    ----------
+    path : `tuple` of `str`
+        Keys from the root object to the array.
+    """
+
+    decoder = JSONDecoder()
+
+    def __init__(self, path=("data",)):
+        self.path = tuple(path)
+        self.values = {}
+        self._text = getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._key = None
+        self._state = OBJECT
+
+    def feed(self, chunk: bytes) -> list:
+        """ Parse the next chunk of the document.
+
+        Returns
+        -------
+        `list`
+            The items completed by the chunk.
+
+        Raises
+        ------
+        ValueError
+            If the document is not valid or has no array at "path".
+        """
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        items = []
+        while self._state != DONE:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos >= len(self._buffer):
+                break
+            char = self._buffer[self._pos]
+
+            if self._state in (OBJECT, ARRAY):
+                if char != ("[" if self._state == ARRAY else "{"):
+                    raise ValueError("Unexpected %r at %s" % (char, self.path))
+                self._pos += 1
+                self._state = ITEM if self._state == ARRAY else KEY
+            elif self._state == KEY:
+                if char == ",":
+                    self._pos += 1
+                elif char == "}":
+                    if self._depth < len(self.path):
+                        raise ValueError("No array at %s" % (self.path,))
+                    self._pos += 1
+                    self._state = DONE
+                else:
+                    key = self._decode()
+                    if key is INCOMPLETE:
+                        break
+                    self._key = key
+                    self._state = COLON
+            elif self._state == COLON:
+                if char != ":":
+                    raise ValueError("Unexpected %r at %s" % (char, self.path))
+                self._pos += 1
+                self._state = VALUE
+            elif self._state == VALUE:
+                if (self._depth < len(self.path)
+                        and self._key == self.path[self._depth]):
+                    self._depth += 1
+                    self._state = ARRAY if self._depth == len(
+                        self.path) else OBJECT
+                else:
+                    value = self._decode()
+                    if value is INCOMPLETE:
+                        break
+                    self.values[self._key] = value
+                    self._state = KEY
+            elif char == ",":
+                self._pos += 1
+            elif char == "]":
+                # the values after the array are kept until its object ends
+                self._pos += 1
+                self._state = KEY
+            else:
+                item = self._decode()
+                if item is INCOMPLETE:
+                    break
+                items.append(item)
+        return items
+
+    def close(self):
+        """ Check that the whole array and its object have been fed.
+
+        Raises
+        ------
+        ValueError
+            If the document ended before the end of the array.
+        """
+        if self._state != DONE:
+            raise ValueError("Incomplete JSON document")
+
+    def _decode(self):
+        try:
+            value, end = self.decoder.raw_decode(self._buffer, self._pos)
+        except JSONDecodeError:
+            return INCOMPLETE
+        # a number is only complete once a delimiter follows, E.g "2" may
+        # continue as "2.5" in the next chunk
+        if end >= len(self._buffer) or self._buffer[end] not in DELIMITERS:
+            return INCOMPLETE
+        self._pos = end
+        return value
+
+
+class Stream:
+    """ Stream exposes the same endpoints as the Client, but each endpoint
+    method returns an iterator over the records of the response, parsed
+    incrementally while the response is read. See Client.stream.
+    """
+
+    def __init__(self, stream):
+        self.cryptocurrency = Cryptocurrency(stream)
+        self.global_metrics = GlobalMetrics(stream)
+        self.exchange = Exchange(stream)
+        self.tools = Tools(stream)
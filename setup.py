@@ -17,6 +17,12 @@ setup(
     url="https://github.com/ani071/coinmarketcap",
     keywords=["CoinMarketCap", "API"],
     install_requires=["requests_cache", "requests", "ratelimit"],
+    extras_require={
+        "async": ["aiohttp"],
+        "numpy": ["numpy"],
+        "orjson": ["orjson"],
+        "zstd": ["zstandard"],
+    },
     # Contact
     author="Andreas Isnes Nilsen",
     author_email="andnil94@gmail.com",
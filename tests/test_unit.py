@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import unittest
 import os
 import requests
+import tempfile
+import threading
+import time
 
 from context import coinmarketcap
+from coinmarketcap import records
+from coinmarketcap.convert import Converter, CrossRates
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from json import dumps, loads
+from urllib.parse import parse_qs, urlsplit
 from pathlib import Path
+from unittest import mock
 
 
 class TestClient(unittest.TestCase):
@@ -64,5 +75,1060 @@ class TestClient(unittest.TestCase):
             self.sandbox.request("error", {})
 
 
+def response(status, body, from_cache=False, apikey="key"):
+    res = requests.Response()
+    res.status_code = status
+    res._content = body
+    res.from_cache = from_cache
+    res.request = requests.Request(
+        "GET", "https://coinmarketcap.com",
+        headers={"X-CMC_PRO_API_KEY": apikey}).prepare()
+    return res
+
+
+def mocked_client(get=None, **kwargs):
+    """ Sandbox client with a mocked session, nothing is cached and the
+    requests are answered by "get".
+    """
+    kwargs.setdefault("apikey", "key")
+    client = coinmarketcap.Client(sandbox=True, **kwargs)
+    client._session = mock.Mock()
+    client._session.lookup.return_value = None
+    if get is not None:
+        client._session.get.side_effect = get
+    return client
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = mocked_client()
+
+    def test_gather(self):
+        self.client._session.lookup = lambda url, expire: response(
+            200, b'{"data": "2"}', True) if url.endswith("id=2") else None
+        self.client._session.get = lambda url, **kwargs: response(
+            200, b'{"data": "%s"}' % url[-1:].encode(), url.endswith("id=2")
+        )
+
+        data = self.client.gather(
+            [lambda c, id=id: c.cryptocurrency.info.ids(id) for id in range(5)]
+        )
+        self.assertEqual([d["data"] for d in data], ["0", "1", "2", "3", "4"])
+        self.assertEqual([d["cached"] for d in data],
+                         [False, False, True, False, False])
+
+    def test_batch(self):
+        self.client._session.lookup.return_value = response(
+            200, b"{}", from_cache=True)
+        with mock.patch.object(self.client, "_request_throttle") as throttle:
+            with self.client.batch(workers=1) as batch:
+                future = batch.exchange.info.ids([1, 2])
+                self.assertTrue(future.done())
+                self.assertEqual(batch.gather(), [{"cached": True}])
+            self.assertFalse(throttle.called)
+
+        self.client._session.lookup.return_value = None
+        self.client._session.get.return_value = response(400, b"{}")
+        with self.client.batch() as batch:
+            batch.exchange.info.ids(1)
+            with self.assertRaises(requests.exceptions.HTTPError):
+                batch.gather()
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_lru(self):
+        cache = coinmarketcap.cache.MemoryCache(60, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")),
+                         (1, None, 3))
+
+        cache.set("d", 4, expire=0)
+        cache.set("e", 5, expire=-1)
+        self.assertIsNone(cache.get("d"))
+        self.assertIsNone(cache.get("e"))
+
+    def test_request(self):
+        client = mocked_client(memory=10)
+        client._session.get.return_value = response(200, b'{"data": {}}')
+
+        data = client.cryptocurrency.info.ids(1)
+        self.assertFalse(data["cached"])
+        data = client.cryptocurrency.info.ids(1)
+        self.assertTrue(data["cached"])
+        self.assertEqual(client._session.get.call_count, 1)
+        self.assertEqual(client._session.lookup.call_count, 1)
+
+        # responses from sqlite expire with their age
+        client.clear_cache()
+        res = response(200, b'{"data": {}}', from_cache=True)
+        res.headers["Date"] = "Mon, 01 Jan 2018 00:00:00 GMT"
+        client._session.lookup.return_value = res
+        client.cryptocurrency.info.ids(1)
+        self.assertEqual(len(client._memory), 0)
+
+
+class TestCanonical(unittest.TestCase):
+    def test_canonical(self):
+        canonical = coinmarketcap.endpoints.parser.canonical
+        self.assertEqual(canonical({"id": "2,1,10,1"}), {"id": "1,2,10"})
+        self.assertEqual(canonical({"id": "01"}), {"id": "1"})
+        self.assertEqual(canonical({"convert": "USD,EUR", "limit": "100"}),
+                         {"convert": "EUR,USD", "limit": "100"})
+        self.assertEqual(canonical({"start": "1", "convert": "USD"}), {})
+
+    def test_subsets(self):
+        client = mocked_client(memory=10)
+        client._session.get.return_value = response(
+            200, b'{"data": {"1": "btc", "2": "ltc", "3": "nmc"}}')
+
+        client.cryptocurrency.quotes.latest_ids([3, 2, 1])
+        data = client.cryptocurrency.quotes.latest_ids(["2", 1])
+        self.assertEqual(data["data"], {"1": "btc", "2": "ltc"})
+        self.assertTrue(data["cached"])
+
+        client.cryptocurrency.quotes.latest_ids(1, convert="EUR")
+        self.assertEqual(client._session.get.call_count, 2)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_request(self):
+        client = mocked_client()
+
+        def get(url, **kwargs):
+            time.sleep(0.1)
+            return response(200, b'{"data": {}}')
+
+        client._session.get.side_effect = get
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(client.cryptocurrency.info.ids, 1)
+                       for _ in range(8)]
+            data = [future.result() for future in futures]
+        self.assertEqual(client._session.get.call_count, 1)
+        self.assertEqual([d["data"] for d in data], [{}] * 8)
+
+    def test_async_request(self):
+        client = coinmarketcap.AsyncClient(apikey="key", sandbox=True)
+        session = mock.Mock()
+        session.get.return_value = AsyncResponse(200, b'{"data": {}}')
+        client.session = mock.AsyncMock(return_value=session)
+
+        async def main():
+            return await asyncio.gather(
+                *[client.cryptocurrency.info.ids(1) for _ in range(8)])
+
+        data = asyncio.run(main())
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual([d["data"] for d in data], [{}] * 8)
+
+    def test_async_cancel(self):
+        flights = coinmarketcap.cache.AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"data": {}}
+
+        async def follower(timeout=1):
+            return await asyncio.wait_for(flights.do("a", fetch), timeout)
+
+        async def main():
+            # a follower times out, the leader and other follower finish
+            leader = asyncio.ensure_future(flights.do("a", fetch))
+            await asyncio.sleep(0)
+            results = await asyncio.gather(
+                leader, follower(0.01), follower(), return_exceptions=True)
+
+            # the leader is cancelled, the follower runs the call again
+            leader = asyncio.ensure_future(flights.do("a", fetch))
+            await asyncio.sleep(0)
+            other = asyncio.ensure_future(follower())
+            await asyncio.sleep(0)
+            leader.cancel()
+            return results, await other
+
+        results, other = asyncio.run(main())
+        self.assertEqual(results[0], {"data": {}})
+        self.assertIsInstance(results[1], asyncio.TimeoutError)
+        self.assertEqual(results[2], {"data": {}})
+        self.assertEqual(other, {"data": {}})
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(flights._calls, {})
+
+
+class TestCoalescer(unittest.TestCase):
+    def get(self, url, **kwargs):
+        ids = parse_qs(urlsplit(url).query)["id"][0].split(",")
+        if "0" in ids:
+            return response(400, b'{"status": {}}')
+        data = {id: {"id": int(id)} for id in ids}
+        return response(200, dumps({"data": data}).encode())
+
+    def test_request(self):
+        client = mocked_client(self.get, coalesce=0.05)
+
+        with ThreadPoolExecutor(5) as pool:
+            futures = [pool.submit(client.cryptocurrency.quotes.latest_ids, i)
+                       for i in range(1, 6)]
+            data = [future.result() for future in futures]
+        self.assertEqual(client._session.get.call_count, 1)
+        self.assertEqual([d["data"] for d in data],
+                         [{str(i): {"id": i}} for i in range(1, 6)])
+
+        # an invalid id fails alone
+        with ThreadPoolExecutor(2) as pool:
+            valid = pool.submit(client.exchange.quotes.latest_ids, 1)
+            invalid = pool.submit(client.exchange.quotes.latest_ids, 0)
+            self.assertEqual(valid.result()["data"], {"1": {"id": 1}})
+            with self.assertRaises(requests.exceptions.HTTPError):
+                invalid.result()
+
+    def test_async_request(self):
+        client = coinmarketcap.AsyncClient(
+            apikey="key", sandbox=True, coalesce=0.05)
+        client._fetch = mock.AsyncMock(side_effect=lambda url: loads(
+            self.get(url).text))
+
+        async def main():
+            return await asyncio.gather(*[
+                client.cryptocurrency.quotes.latest_ids(i)
+                for i in range(1, 6)])
+
+        data = asyncio.run(main())
+        self.assertEqual(client._fetch.call_count, 1)
+        self.assertEqual([d["data"] for d in data],
+                         [{str(i): {"id": i}} for i in range(1, 6)])
+
+    def test_async_cancel(self):
+        client = coinmarketcap.AsyncClient(
+            apikey="key", sandbox=True, coalesce=0.05)
+        client._fetch = mock.AsyncMock(side_effect=lambda url: loads(
+            self.get(url).text))
+
+        async def main():
+            leader = asyncio.ensure_future(
+                client.cryptocurrency.quotes.latest_ids(1))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(
+                client.cryptocurrency.quotes.latest_ids(2))
+            await asyncio.sleep(0)
+            leader.cancel()
+            later = await asyncio.wait_for(
+                client.cryptocurrency.quotes.latest_ids(3), 1)
+            return await asyncio.wait_for(follower, 1), later
+
+        follower, later = asyncio.run(main())
+        self.assertEqual(follower["data"], {"2": {"id": 2}})
+        self.assertEqual(later["data"], {"3": {"id": 3}})
+        self.assertEqual(client._coalescer._groups, {})
+
+
+class TestChunks(unittest.TestCase):
+    def test_chunks(self):
+        chunks = coinmarketcap.endpoints.parser.chunks
+        self.assertEqual(chunks({"id": "1,2"}), [{"id": "1,2"}])
+        self.assertEqual(chunks({"slug": "ab,cd,ef", "limit": "1"}, 5),
+                         [{"slug": "ab,cd", "limit": "1"},
+                          {"slug": "ef", "limit": "1"}])
+
+    def test_request(self):
+        client = mocked_client()
+
+        def get(url, **kwargs):
+            ids = parse_qs(urlsplit(url).query)["id"][0].split(",")
+            body = {"status": {"credit_count": 1}, "data": {i: 1 for i in ids}}
+            return response(200, dumps(body).encode())
+
+        client._session.get.side_effect = get
+        data = client.exchange.info.ids(list(range(1000)))
+        self.assertGreater(client._session.get.call_count, 1)
+        self.assertEqual(data["data"], {str(i): 1 for i in range(1000)})
+        self.assertEqual(data["status"]["credit_count"],
+                         client._session.get.call_count)
+        self.assertFalse(data["cached"])
+
+        # requests of a batch are split as well
+        client._session.get.reset_mock()
+        data, = client.gather(
+            [lambda c: c.exchange.info.ids(list(range(1000)))])
+        self.assertGreater(client._session.get.call_count, 1)
+        self.assertEqual(data["data"], {str(i): 1 for i in range(1000)})
+        urls = [c[0][0] for c in client._session.get.call_args_list]
+        self.assertLessEqual(max(map(len, urls)), 4096)
+
+
+class TestPolicy(unittest.TestCase):
+    def test_policy(self):
+        url = "https://sandbox-api.coinmarketcap.com/v1/"
+        policy = coinmarketcap.cache.Policy(3600)
+        self.assertEqual(policy(url + "cryptocurrency/quotes/latest?id=1"), 60)
+        self.assertEqual(policy(url + "exchange/map?start=1"), 86400)
+        self.assertEqual(
+            policy(url + "cryptocurrency/ohlcv/historical?id=1"), 3600)
+        self.assertEqual(
+            policy(url + "global-metrics/quotes/historical?"
+                   "time_end=2018-12-21T00%3A00%3A00"),
+            coinmarketcap.cache.NEVER)
+
+        policy = coinmarketcap.cache.Policy(3600, {})
+        self.assertEqual(policy(url + "cryptocurrency/quotes/latest"), 3600)
+
+        policy = coinmarketcap.cache.Policy(3600, {"cryptocurrency/info": 60})
+        self.assertEqual(policy(url + "cryptocurrency/info?id=1"), 60)
+        self.assertEqual(policy(url + "exchange/info?id=1"), 3600)
+
+    def test_session(self):
+        with tempfile.TemporaryDirectory() as temp:
+            session = coinmarketcap.environment.CachedSession(
+                os.path.join(temp, "cache"), 0)
+            url = "https://sandbox-api.coinmarketcap.com/v1/tools"
+            with mock.patch("requests.Session.send") as send:
+                send.side_effect = lambda *args, **kwargs: response(200, b"{}")
+                session.get(url, expire=coinmarketcap.cache.NEVER)
+                self.assertTrue(
+                    session.get(url, expire=coinmarketcap.cache.NEVER)
+                    .from_cache)
+                self.assertFalse(session.get(url).from_cache)
+                self.assertEqual(send.call_count, 2)
+
+
+class TestCompressedCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.cf = os.path.join(self.temp.name, "cache")
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def test_codecs(self):
+        body = dumps({"data": [{"id": i, "symbol": "C%d" % i}
+                               for i in range(100)]}).encode()
+        for codec in coinmarketcap.backends.codecs().values():
+            data = codec.compress(body)
+            self.assertLess(len(data), len(body) / 4)
+            self.assertEqual(codec.decompress(data), body)
+
+    def test_session(self):
+        session = coinmarketcap.environment.CachedSession(
+            self.cf, 60, "compressed")
+        url = "https://sandbox-api.coinmarketcap.com/v1/tools?amount=1"
+
+        def send(request, **kwargs):
+            res = response(200, b'{"data": {"id": 1}}')
+            res.url = request.url
+            res.headers["Date"] = "Sat, 17 Oct 2026 10:00:00 GMT"
+            return res
+
+        with mock.patch("requests.Session.send") as mocked:
+            mocked.side_effect = send
+            self.assertFalse(session.get(url).from_cache)
+            self.assertTrue(session.cache.has_url(url))
+            cached = session.get(url)
+            self.assertEqual(mocked.call_count, 1)
+
+        self.assertTrue(cached.from_cache)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.json(), {"data": {"id": 1}})
+        self.assertEqual(cached.headers["Date"],
+                         "Sat, 17 Oct 2026 10:00:00 GMT")
+
+        session.cache.clear()
+        self.assertFalse(session.cache.has_url(url))
+
+    def test_unknown_codec(self):
+        cache = coinmarketcap.backends.CompressedCache(self.cf)
+        res = response(200, b"{}")
+        res.url = "https://coinmarketcap.com"
+        cache.save_response("key", res)
+        self.assertIsNotNone(cache.get_response_and_time("key")[0])
+        cache.codecs = {}
+        self.assertEqual(cache.get_response_and_time("key"), (None, None))
+
+
+class TestConcurrentCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.cache = coinmarketcap.backends.ConcurrentCache(
+            self.temp.name, shards=4, batch=8, delay=60)
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def save(self, key):
+        res = response(200, dumps({"data": key}).encode())
+        res.url = "https://coinmarketcap.com/" + key
+        self.cache.save_response(key, res)
+
+    def get(self, key):
+        res = self.cache.get_response_and_time(key)[0]
+        return None if res is None else res.json()["data"]
+
+    def test_batch(self):
+        self.save("a")
+        self.assertEqual(self.get("a"), "a")
+        self.assertIn("a", self.cache.pending)
+
+        self.cache.add_key_mapping("b", "a")
+        self.cache.flush()
+        self.assertEqual(self.cache.pending, {})
+        self.assertEqual(self.get("a"), "a")
+        self.assertEqual(self.get("b"), "a")
+
+        self.cache.delete("b")
+        self.assertFalse(self.cache.has_key("a"))
+        self.assertFalse(self.cache.has_key("b"))
+
+    def test_threads(self):
+        keys = ["key%d" % i for i in range(200)]
+        with ThreadPoolExecutor(32) as pool:
+            list(pool.map(self.save, keys))
+            self.assertEqual(list(pool.map(self.get, keys)), keys)
+
+        self.cache.flush()
+        self.assertEqual(self.cache.pending, {})
+        shards = [self.cache.connection(shard).execute(
+            "select count(*) from `responses`").fetchone()[0]
+            for shard in range(4)]
+        self.assertEqual(sum(shards), 200)
+        self.assertTrue(all(shards))
+
+        self.cache.clear()
+        self.assertIsNone(self.get("key1"))
+
+    def test_close(self):
+        self.save("a")
+        writer = self.cache._writer
+        self.cache.close()
+        self.assertFalse(writer.is_alive())
+        self.assertNotIn(self.cache, coinmarketcap.backends.OPEN)
+
+        cache = coinmarketcap.backends.ConcurrentCache(
+            self.temp.name, shards=4)
+        self.assertEqual(cache.get_response_and_time("a")[0].json(),
+                         {"data": "a"})
+        cache.save_response("b", cache.get_response_and_time("a")[0])
+        writer = cache._writer
+        del cache
+        writer.join(1)
+        self.assertFalse(writer.is_alive())
+
+
+class TestThrottler(unittest.TestCase):
+    def test_reserve(self):
+        throttler = coinmarketcap.environment.Throttler(
+            "basic", "minute", True)
+        waits = [throttler.reserve() for _ in range(12)]
+        self.assertEqual(waits[:10], [0] * 10)
+        self.assertAlmostEqual(waits[10], 6, 1)
+        self.assertAlmostEqual(waits[11], 12, 1)
+
+    def test_block(self):
+        throttler = coinmarketcap.environment.Throttler(
+            "basic", "minute", False)
+        for _ in range(10):
+            throttler.throttle()
+        with self.assertRaises(coinmarketcap.environment.RateLimitException):
+            throttler.throttle()
+
+    def test_expired(self):
+        # refetching an expired response is throttled like a miss
+        client = coinmarketcap.Client(
+            apikey="key", sandbox=True, throttle="credits", block=False,
+            policy=True)
+        with tempfile.TemporaryDirectory() as temp:
+            client._session = coinmarketcap.environment.CachedSession(
+                os.path.join(temp, "cache"), 3600)
+            cache = client._session.cache
+            with mock.patch("requests.Session.send") as send:
+                send.side_effect = lambda *args, **kwargs: response(
+                    200, b'{"data": {"1": {}}}')
+                client.cryptocurrency.quotes.latest_ids(1)
+                client.cryptocurrency.quotes.latest_ids(1)
+                self.assertEqual(send.call_count, 1)
+
+                key = cache.create_key(client._session.prepare_request(
+                    requests.Request("GET", send.call_args[0][0].url)))
+                res, created = cache.responses[key]
+                cache.responses[key] = res, created - timedelta(seconds=120)
+                client.cryptocurrency.quotes.latest_ids(1)
+                self.assertEqual(send.call_count, 2)
+
+        minute = client._throttler.throttlers["key"].credits.minute
+        self.assertLess(minute.tokens, 8.5)
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp.name, "throttle.sqlite")
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def test_reserve(self):
+        # two stores on the same database act like two processes
+        store = coinmarketcap.environment.Store
+        throttlers = [
+            coinmarketcap.environment.Throttler("basic", "minute", True,
+                                                store(self.path), "key")
+            for _ in range(2)
+        ]
+        waits = [throttlers[i % 2].reserve() for i in range(11)]
+        self.assertEqual(waits[:10], [0] * 10)
+        self.assertAlmostEqual(waits[10], 6, 1)
+
+        other = coinmarketcap.environment.Throttler(
+            "basic", "minute", True, throttlers[0].limiter.lock.store, "other")
+        self.assertEqual(other.reserve(), 0)
+
+    def test_credits(self):
+        store = coinmarketcap.environment.Store
+        throttlers = [
+            coinmarketcap.environment.Throttler("basic", "credits", False,
+                                                store(self.path), "key")
+            for _ in range(2)
+        ]
+        throttlers[0].throttle(300)
+        throttlers[1].reconcile(300, {"status": {"credit_count": 330}})
+        with self.assertRaises(coinmarketcap.environment.RateLimitException):
+            throttlers[1].throttle(10)
+        throttlers[0].throttle(3)
+
+
+class TestKeyPool(unittest.TestCase):
+    def test_reserve(self):
+        pool = coinmarketcap.environment.KeyPool(
+            ["a", "b"], ["basic", "hobbyist"], "minute", True)
+        apikeys = [pool.reserve()[0] for _ in range(60)]
+        # the hobbyist key has the larger budget until both are even
+        self.assertEqual(apikeys[:50], ["b"] * 50)
+        self.assertIn("a", apikeys[50:])
+
+        pool = coinmarketcap.environment.KeyPool(
+            ["a", "b", "c"], "basic", None, True)
+        apikeys = [pool.reserve()[0] for _ in range(6)]
+        self.assertEqual(apikeys, ["a", "b", "c", "a", "b", "c"])
+
+        with self.assertRaises(ValueError):
+            coinmarketcap.environment.KeyPool(["a"], ["basic"] * 2, None, True)
+
+    def test_request(self):
+        client = mocked_client(
+            lambda url, expire, headers: response(
+                200, b'{"status": {"credit_count": 5}}',
+                apikey=headers["X-CMC_PRO_API_KEY"]),
+            apikey=["a", "b"], throttle="credits")
+
+        client.cryptocurrency.info.ids(1)
+        client.cryptocurrency.info.ids(2)
+        apikeys = [c[1]["headers"]["X-CMC_PRO_API_KEY"]
+                   for c in client._session.get.call_args_list]
+        self.assertEqual(apikeys, ["a", "b"])
+        for throttler in client._throttler.throttlers.values():
+            self.assertAlmostEqual(throttler.credits.daily.tokens, 328, 0)
+
+
+class TestCredits(unittest.TestCase):
+    def test_credits(self):
+        url = "https://sandbox-api.coinmarketcap.com/v1/cryptocurrency/"
+        credits = coinmarketcap.environment.credits
+        self.assertEqual(credits(url + "info?id=1%2C2"), 1)
+        self.assertEqual(credits(url + "map?start=1&limit=5000"), 1)
+        self.assertEqual(
+            credits(url + "listings/latest?limit=250&convert=USD%2CEUR"), 4)
+        self.assertEqual(
+            credits(url + "ohlcv/historical?id=1&count=1000&convert=USD"), 10)
+
+    def test_throttle(self):
+        throttler = coinmarketcap.environment.Throttler(
+            "basic", "credits", False)
+        throttler.throttle(300)
+        throttler.reconcile(300, {"status": {"credit_count": 330}})
+        self.assertAlmostEqual(throttler.credits.daily.tokens, 3, 2)
+        self.assertAlmostEqual(throttler.credits.monthly.tokens, 9670, 0)
+
+        with self.assertRaises(coinmarketcap.environment.RateLimitException):
+            throttler.throttle(10)
+        throttler.throttle(3)
+
+
+class TestPages(unittest.TestCase):
+    def get(self, url, **kwargs):
+        query = parse_qs(urlsplit(url).query)
+        start = int(query.get("start", ["1"])[0])
+        limit = int(query["limit"][0])
+        pairs = [{"id": i} for i in range(start, min(start + limit, 13))]
+        return response(200, dumps({"data": {"market_pairs": pairs}}).encode())
+
+    def test_iter(self):
+        client = mocked_client(self.get)
+
+        pages = client.exchange.pairs.iter_id(1, limit=5)
+        self.assertFalse(client._session.get.called)
+        self.assertEqual([p["id"] for p in pages], list(range(1, 13)))
+        self.assertEqual(client._session.get.call_count, 3)
+
+        # a full last page needs one more request to find the end
+        pairs = client.cryptocurrency.pairs.iter_symbol("BTC", 3, limit=5)
+        self.assertEqual([p["id"] for p in pairs], list(range(3, 13)))
+
+    def test_prefetch(self):
+        client = mocked_client()
+        requested = threading.Event()
+
+        def get(url, **kwargs):
+            if "start=11" in url:
+                requested.set()
+            return self.get(url)
+
+        client._session.get.side_effect = get
+        pages = iter(client.exchange.pairs.iter_id(1, limit=5, prefetch=2))
+        self.assertEqual(next(pages)["id"], 1)
+        # the third page is in flight while the first is consumed
+        self.assertTrue(requested.wait(1))
+        self.assertEqual([p["id"] for p in pages], list(range(2, 13)))
+        self.assertLessEqual(client._session.get.call_count, 5)
+
+    def test_async_iter(self):
+        client = coinmarketcap.AsyncClient(apikey="key", sandbox=True)
+        client._fetch = mock.AsyncMock(side_effect=lambda url: loads(
+            self.get(url).text))
+
+        async def main():
+            return [p["id"] async for p in
+                    client.cryptocurrency.pairs.iter_id(1, limit=4)]
+
+        self.assertEqual(asyncio.run(main()), list(range(1, 13)))
+        self.assertEqual(client._fetch.call_count, 4)
+
+        async def prefetch():
+            return [p["id"] async for p in client.exchange.pairs.iter_slug(
+                "binance", limit=4, prefetch=3)]
+
+        self.assertEqual(asyncio.run(prefetch()), list(range(1, 13)))
+
+
+class TestBackfill(unittest.TestCase):
+    def get(self, url, **kwargs):
+        query = parse_qs(urlsplit(url).query)
+        history = coinmarketcap.history
+        start = history.timestamp(query["time_start"][0])
+        end = history.timestamp(query["time_end"][0])
+        self.assertLessEqual((end - start).total_seconds() / 3600, 10000)
+        # the first bar of a window repeats the last bar of the previous one
+        bars = [{"time_open": (start + timedelta(hours=h)).isoformat()}
+                for h in range(int((end - start).total_seconds() // 3600) + 1)]
+        data = {"id": int(query["id"][0]), "quotes": bars}
+        return response(200, dumps({"data": data}).encode())
+
+    def test_windows(self):
+        windows = coinmarketcap.history.windows
+        self.assertEqual(len(windows(0, 86400 * 365, "daily", "daily")), 1)
+        spans = windows("2018-01-01", "2020-01-01", "hourly", "hourly")
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(spans[0][1], spans[1][0])
+        self.assertEqual(len(windows(0, 3600 * 10000, "hourly", "4h")), 1)
+        self.assertEqual([count for _, _, count in spans], [10000, 7521])
+        self.assertEqual(windows(0, 86400, "hourly", "hourly")[0][2], 25)
+        with self.assertRaises(ValueError):
+            windows(0, 1, "daily", "fortnightly")
+
+    def test_backfill(self):
+        client = mocked_client(self.get)
+
+        data = client.backfill(
+            [1, 2], "2018-01-01", "2020-01-01", "hourly", "hourly")
+        self.assertEqual(client._session.get.call_count, 4)
+        self.assertEqual(set(data), {"1", "2"})
+        times = [bar["time_open"] for bar in data["1"]["quotes"]]
+        self.assertEqual(len(times), 730 * 24 + 1)
+        self.assertEqual(times, sorted(set(times)))
+        self.assertEqual(data["2"]["id"], 2)
+
+        # each window is billed by its own number of bars
+        urls = [c[0][0] for c in client._session.get.call_args_list]
+        self.assertEqual(sorted(coinmarketcap.environment.credits(url)
+                                for url in urls), [76, 76, 100, 100])
+
+    def test_async_backfill(self):
+        client = coinmarketcap.AsyncClient(apikey="key", sandbox=True)
+        client._fetch = mock.AsyncMock(side_effect=lambda url: loads(
+            self.get(url).text))
+
+        data = asyncio.run(client.backfill(
+            1, "2018-01-01", "2020-01-01", "hourly", "hourly"))
+        self.assertEqual(client._fetch.call_count, 2)
+        self.assertEqual(len(data["1"]["quotes"]), 730 * 24 + 1)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mktemp()
+        self.client = mocked_client(TestBackfill().get, history=self.path)
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_gaps(self):
+        history = self.client.history
+        times = lambda bars: [bar["time_open"][:13] for bar in bars]
+
+        bars = history.ohlcv(1, "2019-01-01", "2019-01-02", "hourly", "1h")
+        self.assertEqual(len(bars), 24)
+        self.assertEqual(self.client._session.get.call_count, 1)
+
+        # a held range is not requested again
+        self.client._session.get.reset_mock()
+        self.assertEqual(times(history.ohlcv(
+            1, "2019-01-01T06:00", "2019-01-01T12:00", "hourly", "1h")),
+            ["2019-01-01T%02d" % h for h in range(7, 13)])
+        self.assertFalse(self.client._session.get.called)
+
+        # only the missing range after the held range is requested
+        bars = history.ohlcv(1, "2019-01-01", "2019-01-03", "hourly", "1h")
+        self.assertEqual(len(bars), 48)
+        self.assertEqual(self.client._session.get.call_count, 1)
+        url = self.client._session.get.call_args[0][0]
+        self.assertIn("time_start=2019-01-02", url)
+        # the gap of a day is billed for its bars, not for 10000
+        self.assertIn("count=25&", url)
+        self.assertEqual(coinmarketcap.environment.credits(url), 1)
+
+        # other series are kept apart
+        history.ohlcv(2, "2019-01-01", "2019-01-02", "hourly", "1h")
+        self.assertEqual(self.client._session.get.call_count, 2)
+
+
+class TestArrays(unittest.TestCase):
+    def test_ohlcv(self):
+        bar = {"open": 1, "high": 2, "low": 0.5, "close": 1.5,
+               "volume": None, "market_cap": 10}
+        data = {"id": 1, "quotes": [
+            {"time_open": "2019-01-01T00:00:00.000Z", "quote": {"USD": bar}},
+            {"time_open": "2019-01-02T00:00:00.000Z", "quote": {"USD": bar}},
+        ]}
+        res = coinmarketcap.arrays.ohlcv(data)
+        self.assertEqual(res["time"].tolist(), [1546300800, 1546387200])
+        self.assertEqual(res["close"].tolist(), [1.5, 1.5])
+        self.assertTrue(all(v != v for v in res["volume"]))
+
+        columns = coinmarketcap.arrays.ohlcv(data["quotes"], columns=True)
+        self.assertTrue(columns["open"].flags["C_CONTIGUOUS"])
+        self.assertEqual(len(coinmarketcap.arrays.ohlcv([])), 0)
+
+    def test_quotes(self):
+        quote = {"total_market_cap": 1, "total_volume_24h": 2}
+        res = coinmarketcap.arrays.quotes({"quotes": [
+            {"timestamp": "2019-01-01T00:05:00.000Z",
+             "quote": {"EUR": quote}}]}, "EUR")
+        self.assertEqual(res.dtype.names,
+                         ("time", "total_market_cap", "total_volume_24h"))
+        self.assertEqual(res["time"][0], 1546301100)
+
+
+class TestStream(unittest.TestCase):
+    def test_items(self):
+        body = {"status": {"credit_count": 2},
+                "data": [{"id": i, "name": "é" * i} for i in range(20)]
+                + [1, 2.5, -1e-7, "x", None]}
+        doc = dumps(body).encode()
+        for size in (1, 3, 64):
+            items = coinmarketcap.stream.Items()
+            data = []
+            for i in range(0, len(doc), size):
+                data += items.feed(doc[i:i + size])
+            items.close()
+            self.assertEqual(data, body["data"])
+            self.assertEqual(items.values, {"status": {"credit_count": 2}})
+
+        items = coinmarketcap.stream.Items(("data", "market_pairs"))
+        self.assertEqual(items.feed(b'{"data": {"id": 1, "market_pairs": '
+                                    b'[{"a": 1}, {"a": 2}'), [{"a": 1}])
+        self.assertEqual(items.feed(b"]}}"), [{"a": 2}])
+        items.close()
+
+        with self.assertRaises(ValueError):
+            coinmarketcap.stream.Items().feed(b'{"status": {}}')
+        with self.assertRaises(ValueError):
+            items = coinmarketcap.stream.Items()
+            items.feed(b'{"data": [1, 2')
+            items.close()
+
+    def test_stream(self):
+        client = coinmarketcap.Client(apikey="key", sandbox=True)
+        session = mock.Mock()
+        client.stream_session = lambda: session
+        res = response(200, dumps(
+            {"data": {"market_pairs": [{"id": i} for i in range(3)]}}
+        ).encode())
+        res._content_consumed = True
+        session.get.return_value = res
+
+        pairs = client.streaming.exchange.pairs.id(1, limit=3)
+        self.assertFalse(session.get.called)
+        self.assertEqual([p["id"] for p in pairs], [0, 1, 2])
+        self.assertTrue(session.get.call_args[1]["stream"])
+
+        res = response(400, b'{"status": {}}')
+        res._content_consumed = True
+        session.get.return_value = res
+        with self.assertRaises(requests.exceptions.HTTPError):
+            list(client.stream("error", {}))
+
+    def test_async_stream(self):
+        client = coinmarketcap.AsyncClient(apikey="key", sandbox=True)
+        session = mock.Mock()
+        client.session = mock.AsyncMock(return_value=session)
+        res = AsyncResponse(200, dumps({"data": [1, 2, 3]}).encode())
+
+        async def iter_chunked(size):
+            for i in range(0, len(res.body), 4):
+                yield res.body[i:i + 4]
+
+        res.content = mock.Mock(iter_chunked=iter_chunked)
+        session.get.return_value = res
+
+        async def main():
+            return [i async for i in
+                    client.streaming.cryptocurrency.listings.latest_start()]
+
+        self.assertEqual(asyncio.run(main()), [1, 2, 3])
+
+
+class TestRecords(unittest.TestCase):
+    def test_listing(self):
+        row = {"id": 1, "symbol": "".join(["BT", "C"]), "cmc_rank": 1,
+               "unknown": 1, "quote": {"USD": {"price": 2.5, "other": 0}}}
+        listing = records.Listing.from_json(row)
+        self.assertEqual((listing.id, listing.symbol, listing.name),
+                         (1, "BTC", None))
+        self.assertIs(listing.symbol, "BTC")
+        self.assertEqual(listing.quote["USD"].price, 2.5)
+        self.assertIsNone(listing.quote["USD"].market_cap)
+        self.assertFalse(hasattr(listing, "__dict__"))
+        with self.assertRaises(AttributeError):
+            listing.unknown = 1
+        self.assertEqual(records.Listing.from_json(listing.to_json()),
+                         listing)
+
+    def test_records(self):
+        pairs = records.records({"data": {"id": 1, "market_pairs": [
+            {"market_pair": "BTC/USD", "quote": {"USD": {"price": 1}}}]}},
+            records.MarketPair)
+        self.assertEqual(pairs[0].quote["USD"].price, 1)
+
+        bars = records.records({"data": {"id": 1, "quotes": [
+            {"time_open": "2019-01-01", "quote": {"USD": {"close": 2}}}]}},
+            records.OhlcvBar)
+        self.assertEqual(bars[0].quote["USD"].close, 2)
+
+        quotes = records.records(
+            {"data": {"1": {"id": 1}, "2": {"id": 2}}}, records.Listing)
+        self.assertEqual([q.id for q in quotes], [1, 2])
+
+
+class TestResolver(unittest.TestCase):
+    COINS = [{"id": 1, "symbol": "BTC", "rank": 1},
+             {"id": 1027, "symbol": "ETH", "rank": 2},
+             {"id": 3, "symbol": "BTC", "rank": 900}]
+
+    def get(self, url, **kwargs):
+        path, query = urlsplit(url).path, parse_qs(urlsplit(url).query)
+        if path.endswith("cryptocurrency/map") and "symbol" in query:
+            data = [{"id": 52, "symbol": "XRP", "rank": 3}]
+        elif path.endswith("cryptocurrency/map"):
+            data = self.COINS
+        elif path.endswith("exchange/map"):
+            data = [{"id": 270, "slug": "binance"}]
+        else:
+            data = {id: {"id": int(id)}
+                    for id in query["id"][0].split(",")}
+        return response(200, dumps({"data": data}).encode())
+
+    def setUp(self):
+        self.path = tempfile.mktemp()
+        self.client = mocked_client(self.get, memory=100, resolve=self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_resolve(self):
+        data = self.client.cryptocurrency.quotes.latest_symbols(
+            ["btc", "ETH"])
+        self.assertEqual(data["data"], {"btc": {"id": 1},
+                                        "ETH": {"id": 1027}})
+        url = self.client._session.get.call_args[0][0]
+        self.assertIn("id=1%2C1027", url)
+
+        # the request by id is cached
+        calls = self.client._session.get.call_count
+        data = self.client.cryptocurrency.quotes.latest_ids(1)
+        self.assertTrue(data["cached"])
+        self.assertEqual(self.client._session.get.call_count, calls)
+
+        # a missing symbol is added to the index
+        data = self.client.cryptocurrency.info.symbols("XRP")
+        self.assertEqual(data["data"], {"XRP": {"id": 52}})
+
+        data = self.client.exchange.info.slugs("Binance")
+        self.assertEqual(data["data"], {"Binance": {"id": 270}})
+
+        # the index is loaded from disk
+        resolver = coinmarketcap.resolver.Resolver(self.client, self.path)
+        self.assertEqual(resolver.symbols,
+                         {"BTC": 1, "ETH": 1027, "XRP": 52})
+        self.assertEqual(resolver.slugs, {"binance": 270})
+
+    def test_failed_build(self):
+        get = self.get
+
+        def failing(url, **kwargs):
+            path, query = urlsplit(url).path, parse_qs(urlsplit(url).query)
+            if path.endswith("/map"):
+                return response(500, b'{"status": {"error_code": 500}}')
+            return response(200, dumps({"data": {
+                symbol: {"symbol": symbol}
+                for symbol in query["symbol"][0].split(",")}}).encode())
+
+        self.client._session.get.side_effect = failing
+        data = self.client.cryptocurrency.quotes.latest_symbols("BTC")
+        self.assertEqual(data["data"], {"BTC": {"symbol": "BTC"}})
+        url = self.client._session.get.call_args[0][0]
+        self.assertIn("symbol=BTC", url)
+        self.assertNotIn("id=", url)
+        self.assertFalse(self.client._resolver._building)
+
+        # the maps aren't requested again until "retry" seconds passed
+        self.client._session.get.reset_mock()
+        self.client.cryptocurrency.quotes.latest_symbols("ETH")
+        self.assertEqual(self.client._session.get.call_count, 1)
+
+        self.client._session.get.side_effect = get
+        self.client._resolver.failed -= self.client._resolver.retry
+        data = self.client.cryptocurrency.quotes.latest_symbols("ETH")
+        self.assertEqual(data["data"], {"ETH": {"id": 1027}})
+
+
+class TestConverter(unittest.TestCase):
+    def get(self, url, **kwargs):
+        if "price-conversion" in url:
+            data = {"quote": {"USD": {"price": 0.5}}}
+        else:
+            data = [
+                {"id": 1, "symbol": "BTC", "quote": {"USD": {"price": 100}}},
+                {"id": 2, "symbol": "LTC", "quote": {"USD": {"price": 10}}},
+            ]
+        return response(200, dumps({"data": data}).encode())
+
+    def test_convert(self):
+        client = mocked_client(self.get)
+        converter = Converter(client, expire=60)
+
+        self.assertEqual(converter.convert_id(2, 1), 200)
+        self.assertEqual(converter.convert_id("1", 1, 2), 10)
+        self.assertEqual(converter.convert_symbol(50, "usd", "LTC"), 5)
+        self.assertEqual(converter.convert_symbol(1, "btc"), 100)
+        self.assertEqual(client._session.get.call_count, 1)
+
+        # unknown cryptocurrencies are converted by the API
+        self.assertEqual(converter.convert_id(4, 825), 2)
+        self.assertEqual(converter.convert_symbol(4, "USDT", "BTC"), 0.02)
+        self.assertEqual(client._session.get.call_count, 3)
+
+        # the snapshot is refreshed once it is stale
+        converter.updated -= 61
+        converter.convert_id(1, 1)
+        self.assertEqual(client._session.get.call_count, 4)
+
+    def test_cross_rates(self):
+        client = mocked_client()
+
+        def get(url, **kwargs):
+            if "price-conversion" in url:
+                quote = {"EUR": {"price": 0.5}, "XAU": {"price": None}}
+                data = {"symbol": "USD", "quote": quote}
+            else:
+                data = {
+                    "1": {"symbol": "BTC", "quote": {"USD": {"price": 100}}},
+                    "2": {"symbol": "LTC", "quote": {"USD": {"price": 10}}},
+                }
+            return response(200, dumps({"data": data}).encode())
+
+        client._session.get.side_effect = get
+        rates = CrossRates(
+            client, [1, 2], ["USD", "EUR", "btc", "XAU"], expire=60)
+        matrix = rates.rates()
+        self.assertEqual(matrix.shape, (2, 4))
+        # 1 USD is 0.5 EUR
+        self.assertEqual(matrix[:, :3].tolist(), [[100, 50, 1], [10, 5, 0.1]])
+        self.assertTrue(all(v != v for v in matrix[:, 3]))
+        self.assertEqual(rates.rate(2, "eur"), 5)
+        self.assertEqual(client._session.get.call_count, 2)
+
+        # the anchors are kept when the snapshot is refreshed
+        rates.updated -= 61
+        rates.rates()
+        self.assertEqual(client._session.get.call_count, 3)
+
+
+class AsyncResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.reason = "reason"
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        self.client = coinmarketcap.AsyncClient(apikey="key", sandbox=True)
+        self.session = mock.Mock()
+        self.client.session = mock.AsyncMock(return_value=self.session)
+
+    def test_request(self):
+        self.session.get.return_value = AsyncResponse(200, b'{"data": {}}')
+
+        # check if data is fresh, then cached
+        data = asyncio.run(self.client.cryptocurrency.info.ids(1))
+        self.assertEqual(data, {"data": {}, "cached": False})
+        data = asyncio.run(self.client.cryptocurrency.info.ids(1))
+        self.assertEqual(data, {"data": {}, "cached": True})
+        self.assertEqual(self.session.get.call_count, 1)
+
+        # check if exception is raised when status code is not 200
+        self.session.get.return_value = AsyncResponse(400, b'{"status": {}}')
+        with self.assertRaises(requests.exceptions.HTTPError):
+            asyncio.run(self.client.request("error", {}))
+
+    def test_throttle(self):
+        throttler = coinmarketcap.environment.AsyncKeyPool(
+            ["key"], "basic", "minute", True)
+        sleep = mock.AsyncMock()
+        with mock.patch("coinmarketcap.environment.asyncio.sleep", sleep):
+            for _ in range(10):
+                self.assertEqual(asyncio.run(throttler.throttle()), "key")
+            self.assertFalse(sleep.called)
+
+            # the 11th call has to wait for the window to reset
+            sleep.side_effect = InterruptedError
+            with self.assertRaises(InterruptedError):
+                asyncio.run(throttler.throttle())
+        self.assertGreater(sleep.call_args[0][0], 0)
+
+
 if __name__ == "__main__":
     unittest.main()